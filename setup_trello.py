@@ -1,72 +1,67 @@
 """
-This module provides a script to update the Trello-related values in a
-specified .env file.
-It requires the Trello API key and an API token, and updates the IDs of
-the Trello Board, "To Do", "Doing", and "Done" lists on the specified board.
+This module provides a script to provision the Trello boards used by the app
+and record their IDs.
+It requires the Trello API key and an API token, and makes sure each board
+exists with "To Do", "Doing", and "Done" lists. Boards and lists that already
+exist with matching names are reused, so the script can be run again safely,
+for example after a failure partway through.
+
+When a single board is provisioned, its ID is written to the .env file (the
+app discovers the IDs of the lists from the board when it starts). The IDs of
+every board and list can also be written to a JSON file with --output.
 
 Usage:
     poetry run python setup_trello.py
+    poetry run python setup_trello.py "To-Do (staging)" "To-Do (production)" \\
+        --output trello_boards.json
 
 Dependencies:
-    - time
     - dotenv
 """
 
-from time import sleep
+import argparse
 
 from dotenv import load_dotenv, find_dotenv
 
-from todo_app.data.trello_items import create_board, create_list_on_board
+from todo_app.data.trello_provisioning import (
+    provision_boards, update_env_file, write_json_file
+)
 
 load_dotenv()
 
-RATE_LIMIT_DELAY_IN_SECONDS = 0.2
-
-
-def setup_trello():
-    # Create a new board
-    trello_board_name = "APP STORAGE: To-Do List"
-    new_trello_board = create_board(trello_board_name)
-
-    # Create the lists on the board
-    trello_lists = {
-        "Done": "done-list-id",
-        "Doing": "doing-list-id",
-        "To Do": "todo-list-id"
-    }
-
-    for name in trello_lists.keys():
-        new_trello_list = create_list_on_board(name, new_trello_board["id"])
-        trello_lists[name] = new_trello_list["id"]
-        sleep(RATE_LIMIT_DELAY_IN_SECONDS)
-        print(f"'{name}' List created\n")
+DEFAULT_BOARD_NAME = "APP STORAGE: To-Do List"
 
-    # Path to the .env file
-    env_file_path = find_dotenv('.env')
 
-    # Read the existing .env file content
-    with open(env_file_path, 'r') as file:
-        env_content = file.readlines()
+def setup_trello(board_names=(DEFAULT_BOARD_NAME,), output_path=None):
+    # Create the boards and their lists, reusing any that already exist
+    provisioned_boards = provision_boards(list(board_names))
+    for name, board in provisioned_boards.items():
+        print(f"'{name}' board ready with ID {board['board_id']}")
 
-    # Modify the content with the new values
-    new_content = []
-    for line in env_content:
-        if 'TRELLO_TODO_LIST_ID' in line:
-            line = f"TRELLO_TODO_LIST_ID={trello_lists['To Do']}\n"
-        elif 'TRELLO_DOING_LIST_ID' in line:
-            line = f"TRELLO_DOING_LIST_ID={trello_lists['Doing']}\n"
-        elif 'TRELLO_DONE_LIST_ID' in line:
-            line = f"TRELLO_DONE_LIST_ID={trello_lists['Done']}\n"
-        elif 'TRELLO_BOARD_ID' in line:
-            line = f"TRELLO_BOARD_ID={new_trello_board['id']}\n"
-        new_content.append(line)
+    if output_path:
+        write_json_file(output_path, provisioned_boards)
+        print(f"Wrote Trello details to {output_path}.")
 
-    # Write the modified content back to the .env file
-    with open(env_file_path, 'w') as file:
-        file.writelines(new_content)
+    if len(provisioned_boards) == 1:
+        board = next(iter(provisioned_boards.values()))
+        update_env_file(
+            find_dotenv('.env'), {'TRELLO_BOARD_ID': board['board_id']}
+        )
+        print("Updated .env file with the Trello board ID.")
 
-    print("Updated .env file with Trello details.")
+    return provisioned_boards
 
 
 if __name__ == "__main__":
-    setup_trello()
+    parser = argparse.ArgumentParser(
+        description="Provision the Trello boards used by the To-Do app."
+    )
+    parser.add_argument(
+        'board_names', nargs='*', default=[DEFAULT_BOARD_NAME],
+        help="The names of the boards to provision."
+    )
+    parser.add_argument(
+        '--output', help="Write the board and list IDs to this JSON file."
+    )
+    args = parser.parse_args()
+    setup_trello(args.board_names, args.output)
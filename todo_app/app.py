@@ -1,17 +1,95 @@
-from flask import Flask, render_template, redirect, url_for, request
+import hmac
+import logging
 
+import requests
+from flask import Flask, abort, render_template, redirect, url_for, request
+
+from todo_app.compression import Compressor
+from todo_app.data.board_cache import BoardCache, set_board_cache
+from todo_app.data.board_snapshot import BoardSnapshotter
 from todo_app.data.item import Item
+from todo_app.data.tenancy import TenantRegistry
 from todo_app.data.view_model import ViewModel
+from todo_app.data.trello_config import set_trello_config, use_trello_config
 from todo_app.data.trello_items import (
-    get_items, get_item, add_item, delete_item, save_item
+    get_items, get_item, add_item, delete_item, save_item, discover_list_ids,
+    refresh_board_cards
 )
 from todo_app.flask_config import Config
+from todo_app.profiling import RequestProfiler
+
+logger = logging.getLogger(__name__)
 
 
 def create_app():
 
     app = Flask(__name__)
     app.config.from_object(Config())
+    board_cache = BoardCache(
+        ttl=app.config['BOARD_CACHE_TTL'],
+        max_bytes=app.config['BOARD_CACHE_MAX_BYTES']
+    )
+    set_board_cache(board_cache)
+    restored_boards = 0
+    if app.config['BOARD_SNAPSHOT_PATH']:
+        # Serve the boards saved before the last restart while they are
+        # fetched from Trello again in the background. The snapshot also
+        # holds the IDs of the lists on the boards, so they are restored
+        # before they would be looked up.
+        board_snapshotter = BoardSnapshotter(
+            board_cache,
+            app.config['BOARD_SNAPSHOT_PATH'],
+            lambda tenant_id, board_id: refresh_board_cards(
+                tenant_id, board_id, app.config['TRELLO_CONFIG']
+            ),
+            interval=app.config['BOARD_SNAPSHOT_INTERVAL'],
+            reconcile_jitter=app.config['BOARD_SNAPSHOT_RECONCILE_JITTER']
+        )
+        restored_boards = board_snapshotter.restore()
+        app.extensions['board_snapshotter'] = board_snapshotter
+
+    try:
+        app.config['TRELLO_CONFIG'] = discover_list_ids(
+            app.config['TRELLO_CONFIG']
+        )
+    except requests.RequestException:
+        # Start from the snapshot rather than not at all while Trello is
+        # unreachable. Items on boards whose lists are unknown show as done
+        # and cannot be added until the app is restarted.
+        if not restored_boards:
+            raise
+        logger.warning("Could not look up the Trello lists, starting from "
+                       "the board snapshot", exc_info=True)
+    set_trello_config(app.config['TRELLO_CONFIG'])
+    if 'board_snapshotter' in app.extensions:
+        app.extensions['board_snapshotter'].start()
+    Compressor.init_app(app)
+    RequestProfiler.init_app(app)
+
+    if app.config['TRELLO_TENANTS_FILE']:
+        tenants = TenantRegistry.from_file(
+            app.config['TRELLO_TENANTS_FILE'],
+            app.config['TRELLO_CONFIG'],
+            app.config['TENANT_CACHE_SIZE']
+        )
+
+        proxy_secret = app.config['TENANT_PROXY_SECRET'].encode()
+
+        @app.before_request
+        def use_tenant_trello_config():
+            # The tenant is identified by the proxy that signs users in, which
+            # proves itself with the shared secret. Requests without it may
+            # have come straight from a client naming any tenant it likes.
+            request_secret = request.headers.get(
+                app.config['TENANT_PROXY_SECRET_HEADER'], ''
+            ).encode()
+            if not hmac.compare_digest(request_secret, proxy_secret):
+                abort(403)
+            tenant_id = request.headers.get(app.config['TENANT_HEADER'])
+            trello_config = tenants.config_for(tenant_id)
+            if trello_config is None:
+                abort(403)
+            use_trello_config(trello_config)
 
     @app.route('/', methods=['GET'])
     def index():
@@ -0,0 +1,30 @@
+"""
+This module provides a function to replace the content of a file atomically,
+so readers, including other processes, never see a partially written file.
+"""
+
+import os
+import tempfile
+
+
+def write_file_atomically(file_path, content):
+    """
+    Writes the content to a file by writing a temporary file next to it and
+    renaming it into place. The file keeps its permissions if it exists.
+
+    Args:
+        file_path: The path of the file.
+        content (str or bytes): The new content of the file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with os.fdopen(file_descriptor, mode) as file:
+            file.write(content)
+        if os.path.exists(file_path):
+            os.chmod(temp_path, os.stat(file_path).st_mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,133 @@
+"""
+This module provides response compression for the Flask app. Pages rendered
+by the app repeat the same markup for every item, so they are large and
+highly compressible. The compressor:
+
+- Negotiates brotli or gzip with the client through `Accept-Encoding`
+- Skips responses that are too small to benefit from compression
+- Caches compressed bodies keyed by the ETag of the uncompressed body, so
+  identical pages are only compressed once
+
+Brotli is only offered when the optional `brotli` package is installed.
+
+The following configuration values are used:
+- COMPRESS_LEVEL: The compression level passed to gzip and brotli
+- COMPRESS_MIN_SIZE: The smallest body size, in bytes, that is compressed
+- COMPRESS_CACHE_MAX_BYTES: The memory budget for cached compressed bodies
+"""
+
+import gzip
+
+from flask import request
+
+from todo_app.lru_cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json'
+)
+
+
+def supported_encodings():
+    """
+    Returns the content encodings the compressor can produce, in order of
+    preference.
+
+    Returns:
+        list: The supported content encodings.
+    """
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+class Compressor:
+    def __init__(self, level=6, min_size=500, cache_max_bytes=8 * 1024 * 1024):
+        """Initialize a compressor with an empty compressed body cache."""
+        self._level = level
+        self._min_size = min_size
+        self._cache = LRUCache(cache_max_bytes, sizeof=len)
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Creates a compressor from the app configuration and registers it to
+        compress every response the app returns.
+
+        Args:
+            app: The Flask app.
+
+        Returns:
+            Compressor: The registered compressor.
+        """
+        compressor = cls(
+            level=app.config['COMPRESS_LEVEL'],
+            min_size=app.config['COMPRESS_MIN_SIZE'],
+            cache_max_bytes=app.config['COMPRESS_CACHE_MAX_BYTES']
+        )
+        app.after_request(compressor.compress_response)
+        return compressor
+
+    def compress(self, data, encoding):
+        """
+        Compresses the data with the specified content encoding.
+
+        Args:
+            data (bytes): The data to compress.
+            encoding (str): Either 'br' or 'gzip'.
+
+        Returns:
+            bytes: The compressed data.
+        """
+        if encoding == 'br':
+            return brotli.compress(data, quality=self._level)
+        return gzip.compress(data, compresslevel=self._level, mtime=0)
+
+    def compress_response(self, response):
+        """
+        Compresses the body of the response with the best encoding accepted
+        by the client. Compressed bodies are reused for responses whose
+        uncompressed body has the same ETag.
+
+        Args:
+            response: The response returned by a view.
+
+        Returns:
+            response: The response, compressed if the client accepts it.
+        """
+        if not self._is_compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(supported_encodings())
+        if encoding is None or len(response.get_data()) < self._min_size:
+            return response
+
+        # The ETag identifies the uncompressed body, so it doubles as the key
+        # of the compressed body in the cache
+        if 'ETag' not in response.headers:
+            response.add_etag()
+        etag, is_weak = response.get_etag()
+
+        compressed_body = self._cache.get((etag, encoding))
+        if compressed_body is None:
+            compressed_body = self.compress(response.get_data(), encoding)
+            self._cache.put((etag, encoding), compressed_body)
+
+        response.set_data(compressed_body)
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{etag}-{encoding}', weak=is_weak)
+        return response
+
+    def _is_compressible(self, response):
+        return (
+            response.status_code == 200
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+        )
@@ -0,0 +1,320 @@
+"""
+BoardCache Class
+
+This class caches the cards on each Trello board, so pages can be rendered
+without fetching every board from Trello on every request. Entries are kept
+for `ttl` seconds and are partitioned by tenant, keyed by the tenant ID and
+the board ID. The cache is bounded by an estimate of the memory used by the
+cached cards; when it is full, the boards that were used least recently are
+evicted first, so busy tenants stay cached while idle ones drop out.
+
+Only the card fields the app uses are cached (see `CARD_FIELDS`).
+
+Callers take the generation of the cache before fetching a board and pass
+it to `put`, which skips boards invalidated while they were being fetched,
+so a write made during the fetch is never hidden behind the older cards.
+Each invalidation advances the generation and leaves a small marker entry
+recording it in place of the board. The markers live in the same bounded
+cache as the boards; when an entry is evicted its generation is remembered,
+so boards whose marker has been evicted are still skipped.
+
+The cache also keeps the IDs of the lists on each board once they have
+been looked up, so they are not looked up again. They never expire, and
+there is one entry per board the app is configured with.
+
+The cached boards and list IDs can be saved and restored with `entries`,
+`list_id_entries` and `restore`, which `todo_app.data.board_snapshot` uses
+to keep the cache warm across restarts. Restored boards are served whatever
+their age until they are fetched again.
+
+The module also keeps the cache the data layer is currently using, which is
+read through `get_board_cache` and replaced through `set_board_cache`.
+"""
+
+import time
+from collections import namedtuple
+from threading import Lock
+
+from todo_app.lru_cache import LRUCache
+
+CARD_FIELDS = ('id', 'name', 'idList', 'desc', 'due')
+
+# A rough allowance for the memory used by a cached card besides its values
+CARD_OVERHEAD_BYTES = 400
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# The cards of an invalidated board are None
+CachedBoard = namedtuple(
+    'CachedBoard', ['cards', 'fetched_at', 'restored', 'generation'],
+    defaults=[False, 0]
+)
+
+
+def trim_trello_card(trello_card):
+    """
+    Keeps only the fields of a Trello card that the app uses.
+
+    Args:
+        trello_card (dict): The Trello card data.
+
+    Returns:
+        dict: The trimmed card.
+    """
+    return {name: trello_card.get(name) for name in CARD_FIELDS}
+
+
+def estimate_size(cached_board):
+    """
+    Estimates the memory used by the cards of a cached board. Every entry,
+    even an empty board, counts as at least one card, so the number of
+    entries is bounded too.
+
+    Args:
+        cached_board (CachedBoard): The cached board.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    return max(CARD_OVERHEAD_BYTES, sum(
+        CARD_OVERHEAD_BYTES + sum(len(value or '') for value in card.values())
+        for card in cached_board.cards or ()
+    ))
+
+
+class BoardCache:
+    def __init__(self, ttl=0, max_bytes=DEFAULT_MAX_BYTES, clock=time.time):
+        """Initialize an empty cache keeping boards for `ttl` seconds."""
+        self._ttl = ttl
+        self._clock = clock
+        self._boards = LRUCache(
+            max_bytes, sizeof=estimate_size, on_evict=self._evicted
+        )
+        self._changes = 0
+        self._generation = 0
+        self._evicted_generation = 0
+        self._list_ids = {}
+        self._lock = Lock()
+
+    @property
+    def changes(self):
+        """
+        Returns the number of times the cached boards have changed, which
+        tells whether the cache has changed since it was last saved.
+
+        Returns:
+            int: The number of changes.
+        """
+        return self._changes
+
+    def get(self, tenant_id, board_id):
+        """
+        Fetches the cached cards of a board, if they are recent enough.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+
+        Returns:
+            list: The cached cards, or None if the board is not cached or its
+            entry has expired.
+        """
+        cached_board = self._boards.get((tenant_id, board_id))
+        if cached_board is None or cached_board.cards is None or (
+                not cached_board.restored
+                and self._clock() - cached_board.fetched_at >= self._ttl):
+            return None
+        return cached_board.cards
+
+    def generation(self, tenant_id, board_id):
+        """
+        Returns the generation to pass to `put` for a board, to be taken
+        before the board is fetched.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+
+        Returns:
+            int: The number of invalidations so far.
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, tenant_id, board_id, trello_cards, generation=None):
+        """
+        Caches the cards of a board. Nothing is cached when the cache is
+        disabled (its time to live is zero), but any restored copy of the
+        board is dropped.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+            trello_cards (list): The Trello cards on the board.
+            generation (int): The generation of the board taken before the
+                cards were fetched. If the board has been invalidated since,
+                the cards may be out of date and are not cached.
+        """
+        key = (tenant_id, board_id)
+        cards = [trim_trello_card(card) for card in trello_cards]
+        with self._lock:
+            if generation is None:
+                generation = self._generation
+            cached_board = self._boards.get(key)
+            if generation < (self._evicted_generation if cached_board is None
+                             else cached_board.generation):
+                return
+            if self._ttl > 0:
+                self._boards.put(key, CachedBoard(
+                    cards, self._clock(), generation=generation
+                ))
+            else:
+                self._drop(key)
+            self._changes += 1
+
+    def invalidate(self, tenant_id, board_id):
+        """
+        Removes a board from the cache, so it is fetched again on next use,
+        and advances the generation, so fetches already under way are not
+        cached.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+        """
+        with self._lock:
+            self._generation += 1
+            self._boards.put((tenant_id, board_id), CachedBoard(
+                None, self._clock(), generation=self._generation
+            ))
+            self._changes += 1
+
+    def list_ids(self, tenant_id, board_id):
+        """
+        Fetches the IDs of the lists on a board.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+
+        Returns:
+            dict: The list IDs by setting name, or None if they are not
+            known.
+        """
+        with self._lock:
+            list_ids = self._list_ids.get((tenant_id, board_id))
+            return None if list_ids is None else dict(list_ids)
+
+    def put_list_ids(self, tenant_id, board_id, list_ids):
+        """
+        Keeps the IDs of the lists on a board.
+
+        Args:
+            tenant_id: The ID of the tenant using the board.
+            board_id: The ID of the board.
+            list_ids (dict): The list IDs by setting name, such as
+                'todo_list_id'.
+        """
+        with self._lock:
+            if self._list_ids.get((tenant_id, board_id)) != list_ids:
+                self._list_ids[(tenant_id, board_id)] = dict(list_ids)
+                self._changes += 1
+
+    def list_id_entries(self):
+        """
+        Returns the list IDs of every board whose lists are known.
+
+        Returns:
+            list: The tenant ID, board ID and list IDs of each board.
+        """
+        with self._lock:
+            return [
+                (tenant_id, board_id, dict(list_ids))
+                for (tenant_id, board_id), list_ids in self._list_ids.items()
+            ]
+
+    def entries(self):
+        """
+        Returns every cached board, from the least to the most recently used.
+
+        Returns:
+            list: The tenant ID, board ID and cached board of each entry.
+        """
+        return [
+            (tenant_id, board_id, cached_board)
+            for (tenant_id, board_id), cached_board in self._boards.items()
+            if cached_board.cards is not None
+        ]
+
+    def restore(self, entries, list_id_entries=()):
+        """
+        Adds previously saved boards to the cache. They are served until they
+        are fetched again, even if they are older than the time to live.
+
+        Args:
+            entries (list): The tenant ID, board ID, cards and fetch time of
+                each board, from the least to the most recently used.
+            list_id_entries (list): The tenant ID, board ID and list IDs of
+                each board whose lists were known.
+        """
+        with self._lock:
+            for tenant_id, board_id, list_ids in list_id_entries:
+                self._list_ids[(tenant_id, board_id)] = dict(list_ids)
+            for tenant_id, board_id, trello_cards, fetched_at in entries:
+                self._boards.put((tenant_id, board_id), CachedBoard(
+                    trello_cards, fetched_at, restored=True,
+                    generation=self._generation
+                ))
+
+    def restored_boards(self):
+        """
+        Returns the restored boards that have not been fetched again yet.
+
+        Returns:
+            list: The tenant ID and board ID of each board.
+        """
+        return [
+            (tenant_id, board_id)
+            for tenant_id, board_id, cached_board in self.entries()
+            if cached_board.restored
+        ]
+
+    def _drop(self, key):
+        cached_board = self._boards.pop(key)
+        if cached_board is not None:
+            self._evicted(key, cached_board)
+
+    def _evicted(self, key, cached_board):
+        # Called with the lock held, by the LRU cache when it makes room
+        self._evicted_generation = max(
+            self._evicted_generation, cached_board.generation
+        )
+
+
+_board_cache = None
+
+
+def get_board_cache():
+    """
+    Returns the cache used by the data layer. If none has been set, a
+    disabled cache is used.
+
+    Returns:
+        BoardCache: The current cache.
+    """
+    global _board_cache
+    if _board_cache is None:
+        _board_cache = BoardCache()
+    return _board_cache
+
+
+def set_board_cache(board_cache):
+    """
+    Replaces the cache used by the data layer.
+
+    Args:
+        board_cache (BoardCache): The new cache, or None to use a disabled
+            cache.
+    """
+    global _board_cache
+    _board_cache = board_cache
@@ -0,0 +1,197 @@
+"""
+BoardSnapshotter Class
+
+This class keeps the board cache (see `todo_app.data.board_cache`) warm across
+restarts. While the app runs, it periodically saves the cached boards to a
+snapshot file on local disk. When the app starts, it loads the snapshot so
+pages are served from it straight away, then fetches the restored boards from
+Trello again in the background, after a short random delay so that workers
+started together do not all hit Trello at the same moment.
+
+The time each board was last fetched from Trello is saved with it, as the
+sync cursor of the board. Restored boards are served until they have been
+fetched again. The IDs of the lists on each board are saved too, so the app
+and its tenants can start without looking them up on Trello.
+
+Snapshots are written to a temporary file and renamed into place, so a
+crash never leaves a partial snapshot behind. The file starts with a header
+holding the magic bytes `SNAPSHOT_MAGIC` and the format version as a 2 byte
+big-endian integer, followed by the zlib-compressed JSON object:
+
+    {"saved_at": <time>,
+     "boards": [[<tenant ID>, <board ID>, <last fetched time>, <cards>], ...],
+     "lists": [[<tenant ID>, <board ID>, <list IDs>], ...]}
+
+Snapshots with another format version are ignored.
+"""
+
+import atexit
+import json
+import logging
+import random
+import struct
+import time
+import zlib
+from threading import Event, Thread
+
+from todo_app.atomic_file import write_file_atomically
+
+SNAPSHOT_MAGIC = b'TODOSNAP'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('>8sH')
+
+logger = logging.getLogger(__name__)
+
+
+def encode_snapshot(board_cache, saved_at):
+    """
+    Encodes the cached boards as a snapshot.
+
+    Args:
+        board_cache (BoardCache): The cache to encode.
+        saved_at (float): The time the snapshot is taken.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    boards = [
+        [tenant_id, board_id, cached_board.fetched_at, cached_board.cards]
+        for tenant_id, board_id, cached_board in board_cache.entries()
+    ]
+    lists = [
+        [tenant_id, board_id, list_ids]
+        for tenant_id, board_id, list_ids in board_cache.list_id_entries()
+    ]
+    content = json.dumps(
+        {'saved_at': saved_at, 'boards': boards, 'lists': lists},
+        separators=(',', ':')
+    )
+    return (
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+        + zlib.compress(content.encode())
+    )
+
+
+def decode_snapshot(data):
+    """
+    Decodes the boards saved in a snapshot.
+
+    Args:
+        data (bytes): The snapshot.
+
+    Returns:
+        tuple: The tenant ID, board ID, cards and last fetched time of each
+        board, and the tenant ID, board ID and list IDs of each board whose
+        lists were known, or raises a ValueError if the data is not a
+        snapshot in the current format.
+    """
+    try:
+        magic, version = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("The file is not a board snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}.")
+        content = json.loads(zlib.decompress(data[SNAPSHOT_HEADER.size:]))
+        boards = [
+            (tenant_id, board_id, cards, fetched_at)
+            for tenant_id, board_id, fetched_at, cards in content['boards']
+        ]
+        lists = [
+            (tenant_id, board_id, list_ids)
+            for tenant_id, board_id, list_ids in content['lists']
+        ]
+        return boards, lists
+    except (struct.error, zlib.error, KeyError, TypeError) as error:
+        raise ValueError(f"The snapshot is corrupt: {error!r}")
+
+
+class BoardSnapshotter:
+    def __init__(self, board_cache, snapshot_path, refresh_board,
+                 interval=60, reconcile_jitter=5):
+        """Initialize a snapshotter saving the cache every `interval`."""
+        self._board_cache = board_cache
+        self._snapshot_path = snapshot_path
+        self._refresh_board = refresh_board
+        self._interval = interval
+        self._reconcile_jitter = reconcile_jitter
+        self._saved_changes = None
+        self._stopped = Event()
+        self._thread = None
+
+    def restore(self):
+        """
+        Loads the snapshot into the cache, if there is a usable one. This
+        is done before the app looks up the lists on its boards, so the list
+        IDs saved in the snapshot are used instead.
+
+        Returns:
+            int: The number of boards restored.
+        """
+        try:
+            with open(self._snapshot_path, 'rb') as file:
+                entries, list_id_entries = decode_snapshot(file.read())
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as error:
+            logger.warning("Ignoring board snapshot %s: %s",
+                           self._snapshot_path, error)
+            return 0
+
+        self._board_cache.restore(entries, list_id_entries)
+        self._saved_changes = self._board_cache.changes
+        return len(entries)
+
+    def reconcile(self):
+        """
+        Fetch every restored board from Trello again. Boards that cannot be
+        fetched are dropped from the cache, so they are fetched again when
+        they are next used rather than served from the snapshot forever.
+        Boards are refreshed through `refresh_board`, which takes the
+        generation of each board before fetching it, so a board invalidated
+        by a write during the refresh is not overwritten with older cards.
+        """
+        for tenant_id, board_id in self._board_cache.restored_boards():
+            try:
+                self._refresh_board(tenant_id, board_id)
+            except Exception:
+                logger.warning("Could not refresh restored board %s",
+                               board_id, exc_info=True)
+                self._board_cache.invalidate(tenant_id, board_id)
+
+    def save(self):
+        """Save the cache to the snapshot file, if it has changed."""
+        changes = self._board_cache.changes
+        if changes == self._saved_changes:
+            return
+        write_file_atomically(
+            self._snapshot_path, encode_snapshot(self._board_cache, time.time())
+        )
+        self._saved_changes = changes
+
+    def start(self):
+        """
+        Starts a background thread that reconciles the boards restored with
+        `restore` with Trello and saves the cache periodically. The cache is
+        also saved when the process exits.
+        """
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread and save the cache one last time."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save()
+
+    def _run(self):
+        if self._stopped.wait(random.uniform(0, self._reconcile_jitter)):
+            return
+        self.reconcile()
+        while not self._stopped.wait(self._interval):
+            try:
+                self.save()
+            except OSError:
+                logger.warning("Could not save board snapshot %s",
+                               self._snapshot_path, exc_info=True)
@@ -5,34 +5,25 @@ This class represents a to-do item, with attributes for its ID, title, and
 status. The status can be 'Not Started' or 'Complete'. The class provides
 methods to mark the item as complete or not started, and update the title.
 
-The following constants are used to configure the Trello lists:
-- TRELLO_TODO_LIST_ID: The ID of the 'To Do' list on the Trello board
-- TRELLO_DOING_LIST_ID: The ID of the 'Doing' list on the Trello board
-- TRELLO_DONE_LIST_ID: The ID of the 'Done' list on the Trello board
+The IDs of the 'To Do', 'Doing' and 'Done' lists on the Trello boards are
+read from the settings returned by `get_trello_config`. New items are placed
+in the 'To Do' list of the first board unless another list is given, and
+items are moved between lists on the board that holds them.
 """
 
-import os
-
-
-def TRELLO_TODO_LIST_ID():
-    return os.getenv("TRELLO_TODO_LIST_ID")
-
-
-def TRELLO_DOING_LIST_ID():
-    return os.getenv("TRELLO_DOING_LIST_ID")
-
-
-def TRELLO_DONE_LIST_ID():
-    return os.getenv("TRELLO_DONE_LIST_ID")
+from todo_app.data.trello_config import get_trello_config
 
 
 class Item:
-    def __init__(self, title, id=None, id_list=TRELLO_TODO_LIST_ID(),
+    def __init__(self, title, id=None, id_list=None,
                  description=None, due_date=None):
         """Initialize a new Item with the given ID, title, and status."""
         self._title = title
         self._id = id
-        self._id_list = id_list
+        self._id_list = (
+            get_trello_config().sibling_list_id(None, 'To Do')
+            if id_list is None else id_list
+        )
         self._description = description
         self._due_date = due_date
 
@@ -132,11 +123,7 @@ class Item:
         Returns:
             str: The status of the item.
         """
-        return (
-            'To Do' if self.id_list == TRELLO_TODO_LIST_ID()
-            else 'Doing' if self.id_list == TRELLO_DOING_LIST_ID()
-            else 'Done'
-        )
+        return get_trello_config().status_for_list(self.id_list)
 
     def is_status_todo(self):
         """Check if the item is marked as "To Do".
@@ -164,15 +151,21 @@ class Item:
 
     def mark_as_to_do(self):
         """Mark the item as to do."""
-        self._id_list = TRELLO_TODO_LIST_ID()
+        self._id_list = get_trello_config().sibling_list_id(
+            self.id_list, 'To Do'
+        )
 
     def mark_as_doing(self):
         """Mark the item as not started."""
-        self._id_list = TRELLO_DOING_LIST_ID()
+        self._id_list = get_trello_config().sibling_list_id(
+            self.id_list, 'Doing'
+        )
 
     def mark_as_done(self):
         """Mark the item as complete."""
-        self._id_list = TRELLO_DONE_LIST_ID()
+        self._id_list = get_trello_config().sibling_list_id(
+            self.id_list, 'Done'
+        )
 
     def __str__(self):
         """Return a string representation of the item."""
@@ -0,0 +1,93 @@
+"""
+RateLimiter Class
+
+This class limits how often requests are sent to the Trello API. It allows at
+most `max_calls` calls in any rolling window of `period` seconds, blocking
+callers until a call fits within the window. It is thread-safe, so a single
+limiter can be shared by requests sent in parallel.
+
+When Trello rejects a request with HTTP 429 (Too Many Requests), `pause` stops
+every caller for the time given in the response's Retry-After header.
+`call_with_rate_limit` wraps a data layer function with both behaviours.
+
+Trello allows 100 requests per 10 seconds for each API token, which the
+defaults below stay just under.
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+import requests
+
+DEFAULT_MAX_CALLS = 90
+DEFAULT_PERIOD_IN_SECONDS = 10
+DEFAULT_RETRY_AFTER_IN_SECONDS = 10
+MAX_RETRIES = 3
+
+
+class RateLimiter:
+    def __init__(self, max_calls=DEFAULT_MAX_CALLS,
+                 period=DEFAULT_PERIOD_IN_SECONDS,
+                 clock=time.monotonic, sleep=time.sleep):
+        """Initialize a limiter allowing `max_calls` calls per `period`."""
+        self._max_calls = max_calls
+        self._period = period
+        self._clock = clock
+        self._sleep = sleep
+        self._calls = deque()
+        self._paused_until = 0
+        self._lock = Lock()
+
+    def acquire(self):
+        """Block until another call is allowed, then record the call."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._calls and now - self._calls[0] >= self._period:
+                    self._calls.popleft()
+
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if len(self._calls) < self._max_calls:
+                        self._calls.append(now)
+                        return
+                    wait = self._period - (now - self._calls[0])
+            self._sleep(wait)
+
+    def pause(self, seconds):
+        """Stop every caller from making calls for the given time."""
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, self._clock() + seconds
+            )
+
+
+def call_with_rate_limit(limiter, function, *args, **kwargs):
+    """
+    Calls a function that sends a Trello request once the limiter allows it.
+    If Trello responds with HTTP 429, the limiter is paused for the time
+    Trello asks for and the call is retried.
+
+    Args:
+        limiter (RateLimiter): The limiter shared by the calls.
+        function: The function sending the request.
+        *args, **kwargs: The arguments passed to the function.
+
+    Returns:
+        The value returned by the function, or raises the HTTP error if
+        Trello still rejects the request after MAX_RETRIES retries.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return function(*args, **kwargs)
+        except requests.HTTPError as error:
+            response = error.response
+            if (response is None
+                    or response.status_code != requests.codes.too_many_requests
+                    or attempt == MAX_RETRIES):
+                raise
+            limiter.pause(float(response.headers.get(
+                'Retry-After', DEFAULT_RETRY_AFTER_IN_SECONDS
+            )))
@@ -1,10 +1,66 @@
-from flask import session
+import uuid
+
+from flask import current_app, session
+
+from todo_app.data.session_store import SessionItemStore
 
 _DEFAULT_ITEMS = [
     { 'id': 1, 'status': 'Not Started', 'title': 'List saved todo items' },
     { 'id': 2, 'status': 'Not Started', 'title': 'Allow new items to be added' }
 ]
 
+_session_item_store = None
+
+
+def get_session_item_store():
+    """
+    Returns the server-side store holding the items of every session. If
+    none has been set, one is created using the SESSION_ITEMS_DATABASE,
+    SESSION_ITEMS_CACHE_SIZE and SESSION_ITEMS_MAX_AGE app settings.
+
+    Returns:
+        SessionItemStore: The store.
+    """
+    global _session_item_store
+    if _session_item_store is None:
+        _session_item_store = SessionItemStore(
+            current_app.config['SESSION_ITEMS_DATABASE'],
+            current_app.config['SESSION_ITEMS_CACHE_SIZE'],
+            current_app.config['SESSION_ITEMS_MAX_AGE']
+        )
+    return _session_item_store
+
+
+def set_session_item_store(session_item_store):
+    """
+    Replaces the store holding the items of every session.
+
+    Args:
+        session_item_store (SessionItemStore): The new store, or None to
+            create one from the app settings on next use.
+    """
+    global _session_item_store
+    _session_item_store = session_item_store
+
+
+def get_session_id():
+    """
+    Returns the ID the session's items are stored under, which is the only
+    part of them kept in the session cookie. New sessions are given an ID
+    and start with the default items, and make way for them by deleting the
+    sessions that have expired.
+
+    Returns:
+        str: The ID of the session.
+    """
+    if 'items_session_id' not in session:
+        store = get_session_item_store()
+        store.prune_expired()
+        session['items_session_id'] = uuid.uuid4().hex
+        for item in _DEFAULT_ITEMS:
+            store.add_item(session['items_session_id'], item)
+    return session['items_session_id']
+
 
 def get_items():
     """
@@ -13,7 +69,7 @@ def get_items():
     Returns:
         list: The list of saved items.
     """
-    return session.get('items', _DEFAULT_ITEMS.copy())
+    return get_session_item_store().get_items(get_session_id())
 
 
 def get_item(id):
@@ -26,8 +82,7 @@ def get_item(id):
     Returns:
         item: The saved item, or None if no items match the specified ID.
     """
-    items = get_items()
-    return next((item for item in items if item['id'] == int(id)), None)
+    return get_session_item_store().get_item(get_session_id(), int(id))
 
 
 def add_item(title):
@@ -40,18 +95,11 @@ def add_item(title):
     Returns:
         item: The saved item.
     """
-    items = get_items()
-
-    # Determine the ID for the item based on that of the previously added item
-    id = items[-1]['id'] + 1 if items else 0
-
-    item = { 'id': id, 'title': title, 'status': 'Not Started' }
-
-    # Add the item to the list
-    items.append(item)
-    session['items'] = items
-
-    return item
+    # The store determines the ID for the item based on that of the
+    # previously added item
+    return get_session_item_store().add_new_item(
+        get_session_id(), { 'title': title, 'status': 'Not Started' }
+    )
 
 
 def save_item(item):
@@ -61,9 +109,4 @@ def save_item(item):
     Args:
         item: The item to save.
     """
-    existing_items = get_items()
-    updated_items = [item if item['id'] == existing_item['id'] else existing_item for existing_item in existing_items]
-
-    session['items'] = updated_items
-
-    return item
+    return get_session_item_store().save_item(get_session_id(), item)
@@ -0,0 +1,261 @@
+"""
+SessionItemStore Class
+
+This class stores the to-do items of each session on the server, so the
+session cookie only has to carry a session ID, however many items there are.
+The items are kept in an SQLite database, indexed by session ID and item ID,
+with the items of recently used sessions also held in memory. The in-memory
+copies are bounded by a number of sessions; the sessions that were used least
+recently are dropped first and reloaded from the database when next used.
+
+Each session's items are held in a dictionary keyed by item ID, so single
+items are looked up and updated without scanning the whole list. Items are
+copied in and out of the store, so callers never share them with each other.
+
+Every operation runs under a lock of its session, from loading the
+session's items through to storing the change, so concurrent requests of
+the same session cannot lose each other's changes or give two items the
+same ID. Sessions share a fixed set of locks by hash, so requests of other
+sessions rarely wait; the database itself is only locked while it is used.
+
+Several processes, such as the workers of a server, can share a database
+file. Each operation first checks SQLite's `data_version`, which changes
+when another process commits, and drops the in-memory copies if it has
+changed. New item IDs are chosen inside a write transaction and updates
+report whether the item is still there, so they are decided by the
+database rather than by a copy that may be out of date.
+
+The time each session was last used is kept in memory and written to the
+database in batches, at most every `LAST_USED_FLUSH_INTERVAL` seconds, so
+reads served from memory never write to disk. Sessions unused for longer
+than `max_age` seconds are deleted by `prune_expired`.
+"""
+
+import json
+import sqlite3
+import time
+from threading import Lock
+
+from todo_app.lru_cache import LRUCache
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+LAST_USED_FLUSH_INTERVAL = 60
+SESSION_LOCK_COUNT = 64
+
+
+class SessionItemStore:
+    def __init__(self, database=':memory:', cache_size=DEFAULT_CACHE_SIZE,
+                 max_age=DEFAULT_MAX_AGE, clock=time.time):
+        """Initialize a store keeping its items in the given database."""
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._lock = Lock()
+        self._session_locks = [Lock() for _ in range(SESSION_LOCK_COUNT)]
+        self._sessions = LRUCache(cache_size)
+        self._max_age = max_age
+        self._clock = clock
+        self._last_used = {}
+        self._last_used_lock = Lock()
+        self._last_used_flushed_at = clock()
+        self._data_version = None
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS session_items ('
+                'session_id TEXT NOT NULL, item_id INTEGER NOT NULL, '
+                'item TEXT NOT NULL, PRIMARY KEY (session_id, item_id))'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'session_id TEXT PRIMARY KEY, last_used REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS sessions_last_used '
+                'ON sessions (last_used)'
+            )
+
+    def get_items(self, session_id):
+        """
+        Fetches all items of the specified session.
+
+        Args:
+            session_id: The ID of the session.
+
+        Returns:
+            list: Copies of the items of the session, in the order they were
+            added.
+        """
+        with self._session_lock(session_id):
+            return [dict(item) for item in self._load(session_id).values()]
+
+    def get_item(self, session_id, item_id):
+        """
+        Fetches the item with the specified ID from the specified session.
+
+        Args:
+            session_id: The ID of the session.
+            item_id (int): The ID of the item.
+
+        Returns:
+            item: A copy of the item, or None if no items match the specified
+            ID.
+        """
+        with self._session_lock(session_id):
+            item = self._load(session_id).get(item_id)
+            return None if item is None else dict(item)
+
+    def add_item(self, session_id, item):
+        """
+        Adds an item with a given ID to the specified session.
+
+        Args:
+            session_id: The ID of the session.
+            item: The item to add.
+
+        Returns:
+            item: The saved item, or raises an sqlite3.IntegrityError if the
+            session already has an item with the same ID.
+        """
+        with self._session_lock(session_id):
+            return self._insert(session_id, self._load(session_id), item)
+
+    def add_new_item(self, session_id, fields):
+        """
+        Adds an item to the specified session, with the ID one more than that
+        of the previously added item.
+
+        Args:
+            session_id: The ID of the session.
+            fields (dict): The fields of the item, other than its ID.
+
+        Returns:
+            item: The saved item.
+        """
+        with self._session_lock(session_id):
+            items = self._load(session_id)
+            with self._lock, self._connection:
+                # Hold the write lock of the database from choosing the ID
+                # until the item is stored, so other processes cannot choose
+                # the same one
+                self._connection.execute('BEGIN IMMEDIATE')
+                item_id, = self._connection.execute(
+                    'SELECT COALESCE(MAX(item_id), -1) + 1 FROM session_items '
+                    'WHERE session_id = ?',
+                    (session_id,)
+                ).fetchone()
+                item = {'id': item_id, **fields}
+                self._connection.execute(
+                    'INSERT INTO session_items VALUES (?, ?, ?)',
+                    (session_id, item_id, json.dumps(item))
+                )
+            items[item_id] = dict(item)
+            return item
+
+    def save_item(self, session_id, item):
+        """
+        Updates an existing item in the specified session. If no existing
+        item matches the ID of the specified item, nothing is saved.
+
+        Args:
+            session_id: The ID of the session.
+            item: The item to save.
+
+        Returns:
+            item: The item.
+        """
+        with self._session_lock(session_id):
+            items = self._load(session_id)
+            with self._lock, self._connection:
+                updated = self._connection.execute(
+                    'UPDATE session_items SET item = ? '
+                    'WHERE session_id = ? AND item_id = ?',
+                    (json.dumps(item), session_id, item['id'])
+                ).rowcount
+            if updated:
+                items[item['id']] = dict(item)
+            else:
+                items.pop(item['id'], None)
+        return item
+
+    def prune_expired(self):
+        """
+        Deletes the sessions that have not been used for longer than the
+        maximum age, along with their items.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        self._flush_last_used()
+        expired_before = self._clock() - self._max_age
+        with self._lock, self._connection:
+            expired = [
+                session_id for session_id, in self._connection.execute(
+                    'SELECT session_id FROM sessions WHERE last_used < ?',
+                    (expired_before,)
+                )
+            ]
+            self._connection.executemany(
+                'DELETE FROM session_items WHERE session_id = ?',
+                [(session_id,) for session_id in expired]
+            )
+            self._connection.executemany(
+                'DELETE FROM sessions WHERE session_id = ?',
+                [(session_id,) for session_id in expired]
+            )
+            for session_id in expired:
+                self._sessions.pop(session_id)
+        return len(expired)
+
+    def _session_lock(self, session_id):
+        return self._session_locks[hash(session_id) % SESSION_LOCK_COUNT]
+
+    def _insert(self, session_id, items, item):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO session_items VALUES (?, ?, ?)',
+                (session_id, item['id'], json.dumps(item))
+            )
+        items[item['id']] = dict(item)
+        return item
+
+    def _load(self, session_id):
+        # Called with the lock of the session held
+        self._touch(session_id)
+        with self._lock:
+            data_version, = self._connection.execute(
+                'PRAGMA data_version'
+            ).fetchone()
+            if data_version != self._data_version:
+                # Another process has changed the database since it was
+                # last checked, so any session held in memory may be stale
+                self._data_version = data_version
+                self._sessions.clear()
+        items = self._sessions.get(session_id)
+        if items is None:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT item_id, item FROM session_items '
+                    'WHERE session_id = ? ORDER BY item_id',
+                    (session_id,)
+                ).fetchall()
+            items = {item_id: json.loads(item) for item_id, item in rows}
+            self._sessions.put(session_id, items)
+        return items
+
+    def _touch(self, session_id):
+        now = self._clock()
+        with self._last_used_lock:
+            self._last_used[session_id] = now
+            if now - self._last_used_flushed_at < LAST_USED_FLUSH_INTERVAL:
+                return
+        self._flush_last_used()
+
+    def _flush_last_used(self):
+        with self._last_used_lock:
+            last_used, self._last_used = self._last_used, {}
+            self._last_used_flushed_at = self._clock()
+        if last_used:
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO sessions VALUES (?, ?)',
+                    last_used.items()
+                )
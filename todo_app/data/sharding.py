@@ -0,0 +1,123 @@
+"""
+This module spreads the to-do items over several Trello boards, which are
+used as shards. It includes the ability to:
+
+- Encode the shard of an item in its ID, so operations on a single item go
+  straight to the board that holds it
+- Choose the shard of a new item with a placement policy
+- Run a function for every shard concurrently
+
+Item IDs have the form '<shard>-<card ID>', where the shard is the position
+of the board in the settings. IDs without a shard refer to the first board.
+
+The following placement policies are available:
+- 'hash': Places items by a hash of their title
+- 'round-robin': Places items on each board in turn
+- 'date': Places items by their due date, or by the current date for items
+  without one
+"""
+
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+SHARD_SEPARATOR = '-'
+MAX_WORKERS = 16
+
+_round_robin_counter = itertools.count()
+
+
+def encode_item_id(shard, card_id):
+    """
+    Builds the ID of an item from its shard and the ID of its Trello card.
+
+    Args:
+        shard (int): The shard holding the item.
+        card_id: The ID of the Trello card.
+
+    Returns:
+        str: The ID of the item.
+    """
+    return f'{shard}{SHARD_SEPARATOR}{card_id}'
+
+
+def decode_item_id(id):
+    """
+    Splits the ID of an item into its shard and the ID of its Trello card.
+
+    Args:
+        id: The ID of the item.
+
+    Returns:
+        tuple: The shard and the ID of the Trello card.
+    """
+    shard, separator, card_id = str(id).partition(SHARD_SEPARATOR)
+    if not separator or not shard.isdigit():
+        return 0, str(id)
+    return int(shard), card_id
+
+
+def place_by_hash(item, shard_count):
+    """Choose the shard of the item from a hash of its title."""
+    return zlib.crc32((item.title or '').encode()) % shard_count
+
+
+def place_round_robin(item, shard_count):
+    """Choose the shard after the one chosen for the previous item."""
+    return next(_round_robin_counter) % shard_count
+
+
+def place_by_date(item, shard_count):
+    """Choose the shard of the item from its due date or the current date."""
+    try:
+        day = date.fromisoformat((item.due_date or '')[:10])
+    except ValueError:
+        day = date.today()
+    return day.toordinal() % shard_count
+
+
+PLACEMENT_POLICIES = {
+    'hash': place_by_hash,
+    'round-robin': place_round_robin,
+    'date': place_by_date,
+}
+
+
+def choose_shard(item, placement, shard_count):
+    """
+    Chooses the shard of a new item with the specified placement policy.
+
+    Args:
+        item (Item): The new item.
+        placement (str): The name of the placement policy.
+        shard_count (int): The number of shards.
+
+    Returns:
+        int: The shard the item is placed on.
+    """
+    if shard_count == 1:
+        return 0
+    return PLACEMENT_POLICIES[placement](item, shard_count)
+
+
+def map_concurrently(function, values):
+    """
+    Calls the function for every value, such as every shard, concurrently
+    when there is more than one value.
+
+    Args:
+        function: The function to call with each value.
+        values (list): The values.
+
+    Returns:
+        list: The results of the calls, in the order of the values, or
+        raises the first exception raised by a call.
+    """
+    values = list(values)
+    if len(values) <= 1:
+        return [function(value) for value in values]
+
+    with ThreadPoolExecutor(
+            max_workers=min(len(values), MAX_WORKERS)) as executor:
+        return list(executor.map(function, values))
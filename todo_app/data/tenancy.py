@@ -0,0 +1,94 @@
+"""
+TenantRegistry Class
+
+This class maps each tenant (a signed-in user or team) to the Trello boards
+that hold its to-do items, so a single app can serve many tenants. The
+tenants are read from a JSON file mapping each tenant ID to its settings:
+
+    {
+        "team-a": {"board_ids": ["first-board-id", "second-board-id"]},
+        "team-b": {"board_ids": ["board-id"], "placement": "round-robin"}
+    }
+
+The boards of each tenant are used as shards, as described in
+`todo_app.data.trello_config`, and share the API credentials of the app.
+The settings of a tenant are built on first use, which looks up the IDs of
+the lists on its boards, and then cached. The cache holds a bounded number
+of tenants, evicting the tenants that were used least recently. Each tenant
+has a lock, so concurrent first requests of a tenant look up its lists once
+and the other requests wait for the result.
+"""
+
+import json
+from dataclasses import replace
+from threading import Lock
+
+from todo_app.data.trello_config import TrelloBoard
+from todo_app.data.trello_items import discover_list_ids
+from todo_app.lru_cache import LRUCache
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class TenantRegistry:
+    def __init__(self, base_config, tenants, cache_size=DEFAULT_CACHE_SIZE):
+        """Initialize a registry of the given tenants' settings."""
+        self._base_config = base_config
+        self._tenants = tenants
+        self._configs = LRUCache(cache_size)
+        self._locks = {tenant_id: Lock() for tenant_id in tenants}
+
+    @classmethod
+    def from_file(cls, file_path, base_config, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Creates a registry of the tenants listed in a JSON file.
+
+        Args:
+            file_path: The path of the JSON file.
+            base_config (TrelloConfig): The settings shared by every tenant.
+            cache_size (int): The number of tenants whose settings are kept.
+
+        Returns:
+            TenantRegistry: The registry.
+        """
+        with open(file_path, 'r') as file:
+            tenants = json.load(file)
+        return cls(base_config, tenants, cache_size)
+
+    def config_for(self, tenant_id):
+        """
+        Returns the Trello settings of the specified tenant.
+
+        Args:
+            tenant_id: The ID of the tenant.
+
+        Returns:
+            TrelloConfig: The settings of the tenant, or None if the tenant
+            is unknown.
+        """
+        config = self._configs.get(tenant_id)
+        if config is not None:
+            return config
+
+        tenant = self._tenants.get(tenant_id) if tenant_id else None
+        if tenant is None:
+            return None
+
+        with self._locks[tenant_id]:
+            # Another request may have built the settings while this one
+            # waited for the lock
+            config = self._configs.get(tenant_id)
+            if config is not None:
+                return config
+
+            config = replace(
+                self._base_config,
+                tenant_id=tenant_id,
+                boards=tuple(
+                    TrelloBoard(board_id) for board_id in tenant['board_ids']
+                ),
+                placement=tenant.get('placement', self._base_config.placement)
+            ).validate()
+            config = discover_list_ids(config)
+            self._configs.put(tenant_id, config)
+        return config
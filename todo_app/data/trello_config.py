@@ -0,0 +1,299 @@
+"""
+TrelloBoard and TrelloConfig Classes
+
+These classes hold the Trello settings used by the data layer: the API
+credentials and the boards that store the to-do items, each with the IDs of
+its 'To Do', 'Doing' and 'Done' lists. The items can be spread over several
+boards, which are used as shards (see `todo_app.data.sharding`). The settings
+are immutable, so they are built and validated once when the app is created
+and then shared by every request.
+
+The settings are read from the following environment variables:
+- TRELLO_API_KEY: The API key for Trello
+- TRELLO_API_TOKEN: The API token for Trello
+- TRELLO_BOARD_IDS: A comma-separated list of the IDs of the Trello boards to
+  be used. New boards must be added to the end of the list, as item IDs refer
+  to boards by their position in it.
+- TRELLO_BOARD_ID: The ID of the Trello board to be used, when only one board
+  is used and TRELLO_BOARD_IDS is not set
+- TRELLO_SHARD_PLACEMENT: How new items are placed on the boards, one of
+  'hash' (the default), 'round-robin' or 'date'
+- TRELLO_TODO_LIST_ID, TRELLO_DOING_LIST_ID, TRELLO_DONE_LIST_ID: Optional
+  IDs of the lists when only one board is used. When they are not set, they
+  are discovered from the board by list name (see `with_list_ids`).
+
+The module also keeps the settings the data layer is currently using, which
+are read through `get_trello_config` and replaced through
+`set_trello_config`. When the app serves several tenants, the settings of
+the tenant making the current request are set with `use_trello_config` and
+take precedence for the rest of the request.
+"""
+
+import os
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple
+
+from flask import g, has_app_context
+
+from todo_app.data.sharding import PLACEMENT_POLICIES
+
+
+# Maps the name of each list on a board to the setting holding its ID
+LIST_ID_FIELDS_BY_NAME = {
+    'To Do': 'todo_list_id',
+    'Doing': 'doing_list_id',
+    'Done': 'done_list_id',
+}
+
+
+@dataclass(frozen=True)
+class TrelloBoard:
+    board_id: str
+    todo_list_id: Optional[str] = None
+    doing_list_id: Optional[str] = None
+    done_list_id: Optional[str] = None
+
+    @property
+    def has_list_ids(self):
+        """
+        Returns whether the IDs of all three lists are known.
+
+        Returns:
+            bool: True if every list ID is set, False otherwise.
+        """
+        return all(
+            getattr(self, name) for name in LIST_ID_FIELDS_BY_NAME.values()
+        )
+
+    @property
+    def list_ids(self):
+        """
+        Returns the IDs of the lists on the board.
+
+        Returns:
+            dict: The list IDs by setting name, such as 'todo_list_id'.
+        """
+        return {
+            name: getattr(self, name) for name in LIST_ID_FIELDS_BY_NAME.values()
+        }
+
+    def list_id_for_status(self, status):
+        """
+        Returns the ID of the list holding the items with the given status.
+
+        Args:
+            status (str): 'To Do', 'Doing' or 'Done'.
+
+        Returns:
+            str: The ID of the list.
+        """
+        return getattr(self, LIST_ID_FIELDS_BY_NAME[status])
+
+    def with_list_ids(self, trello_lists):
+        """
+        Creates a copy of the board with the list IDs taken from the lists on
+        the board, matching them by name. List IDs that are already set are
+        kept.
+
+        Args:
+            trello_lists (list): The Trello lists on the board.
+
+        Returns:
+            TrelloBoard: The board with every list ID set, or raises a
+            ValueError if the board is missing one of the lists.
+        """
+        list_ids = {}
+        for trello_list in trello_lists:
+            name = LIST_ID_FIELDS_BY_NAME.get(trello_list.get('name'))
+            if name and not getattr(self, name) and name not in list_ids:
+                list_ids[name] = trello_list['id']
+
+        board = replace(self, **list_ids)
+        if not board.has_list_ids:
+            raise ValueError(
+                f"Trello board {self.board_id} needs lists named "
+                f"{', '.join(LIST_ID_FIELDS_BY_NAME)}."
+            )
+        return board
+
+
+@dataclass(frozen=True)
+class TrelloConfig:
+    api_key: Optional[str] = None
+    api_token: Optional[str] = None
+    boards: Tuple[TrelloBoard, ...] = ()
+    placement: str = 'hash'
+    tenant_id: Optional[str] = None
+    # Maps the ID of every list to the board it is on and the status of the
+    # items in it, so item statuses are looked up without scanning the boards
+    _lists: Dict[str, Tuple[TrelloBoard, str]] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        lists = {}
+        for board in self.boards:
+            for status in LIST_ID_FIELDS_BY_NAME:
+                list_id = board.list_id_for_status(status)
+                if list_id:
+                    lists[list_id] = (board, status)
+        object.__setattr__(self, '_lists', lists)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds the settings from the environment variables. Unset and empty
+        variables are treated as missing.
+
+        Returns:
+            TrelloConfig: The settings read from the environment.
+        """
+        board_ids = [
+            board_id.strip() for board_id in (
+                os.getenv('TRELLO_BOARD_IDS')
+                or os.getenv('TRELLO_BOARD_ID') or ''
+            ).split(',') if board_id.strip()
+        ]
+        if len(board_ids) == 1:
+            boards = (TrelloBoard(
+                board_id=board_ids[0],
+                todo_list_id=os.getenv('TRELLO_TODO_LIST_ID') or None,
+                doing_list_id=os.getenv('TRELLO_DOING_LIST_ID') or None,
+                done_list_id=os.getenv('TRELLO_DONE_LIST_ID') or None,
+            ),)
+        else:
+            boards = tuple(TrelloBoard(board_id) for board_id in board_ids)
+
+        return cls(
+            api_key=os.getenv('TRELLO_API_KEY') or None,
+            api_token=os.getenv('TRELLO_API_TOKEN') or None,
+            boards=boards,
+            placement=os.getenv('TRELLO_SHARD_PLACEMENT') or 'hash',
+        )
+
+    @property
+    def has_list_ids(self):
+        """
+        Returns whether the IDs of the lists on every board are known.
+
+        Returns:
+            bool: True if every list ID is set, False otherwise.
+        """
+        return all(board.has_list_ids for board in self.boards)
+
+    def validate(self, require_boards=True):
+        """
+        Checks that the settings needed to reach the boards are present.
+
+        Args:
+            require_boards (bool): Whether boards must be configured, which
+                is not the case when every tenant has its own boards.
+
+        Returns:
+            TrelloConfig: The settings, or raises a ValueError naming the
+            missing or invalid environment variables.
+        """
+        missing = [
+            name for name, value in (
+                ('TRELLO_API_KEY', self.api_key),
+                ('TRELLO_API_TOKEN', self.api_token),
+                ('TRELLO_BOARD_ID', self.boards or not require_boards),
+            ) if not value
+        ]
+        if missing:
+            raise ValueError(
+                f"No {', '.join(missing)} set for Flask application. "
+                "Did you follow the setup instructions?"
+            )
+        if self.placement not in PLACEMENT_POLICIES:
+            raise ValueError(
+                f"TRELLO_SHARD_PLACEMENT must be one of "
+                f"{', '.join(PLACEMENT_POLICIES)}."
+            )
+        return self
+
+    def board_for_shard(self, shard):
+        """
+        Returns the board used as the specified shard.
+
+        Args:
+            shard (int): The position of the board in the settings.
+
+        Returns:
+            TrelloBoard: The board, or raises a ValueError if there is no
+            such shard.
+        """
+        if not 0 <= shard < len(self.boards):
+            raise ValueError(f"There is no Trello board for shard {shard}.")
+        return self.boards[shard]
+
+    def status_for_list(self, list_id):
+        """
+        Returns the status of the items in the list with the specified ID.
+        Items in unknown lists are treated as done.
+
+        Args:
+            list_id: The ID of the list.
+
+        Returns:
+            str: 'To Do', 'Doing' or 'Done'.
+        """
+        return self._lists.get(list_id, (None, 'Done'))[1]
+
+    def sibling_list_id(self, list_id, status):
+        """
+        Returns the ID of the list for the given status on the same board as
+        the specified list, or on the first board if the list is unknown.
+
+        Args:
+            list_id: The ID of a list on the board.
+            status (str): 'To Do', 'Doing' or 'Done'.
+
+        Returns:
+            str: The ID of the list.
+        """
+        board = self._lists.get(list_id, (self.boards[0],))[0]
+        return board.list_id_for_status(status)
+
+
+_trello_config = None
+
+
+def get_trello_config():
+    """
+    Returns the settings used by the data layer: those of the tenant making
+    the current request, if any, or else the settings of the app. If none
+    have been set, they are read from the environment on first use.
+
+    Returns:
+        TrelloConfig: The current settings.
+    """
+    global _trello_config
+    if has_app_context() and 'trello_config' in g:
+        return g.trello_config
+    if _trello_config is None:
+        _trello_config = TrelloConfig.from_env()
+    return _trello_config
+
+
+def set_trello_config(config):
+    """
+    Replaces the settings used by the data layer.
+
+    Args:
+        config (TrelloConfig): The new settings, or None to read them from
+            the environment again on next use.
+    """
+    global _trello_config
+    _trello_config = config
+
+
+def use_trello_config(config):
+    """
+    Sets the settings used by the data layer for the rest of the current
+    request.
+
+    Args:
+        config (TrelloConfig): The settings of the tenant making the request.
+    """
+    g.trello_config = config
@@ -2,50 +2,64 @@
 This module provides functions to interact with a Trello board for managing a
 to-do list. It includes the ability to:
 
-- Retrieve all to-do items (cards) from a specified Trello board
+- Retrieve all to-do items (cards) from the Trello boards, fetching the
+  boards concurrently
 - Fetch a specific item by its ID and status
+- Fetch several specific items at once through the Trello batch endpoint
 - Add a new item with a specified title to the to-do list on Trello
 - Update an existing item on Trello
+- Create, find and delete the boards and lists that store the items
+- Discover the IDs of the 'To Do', 'Doing' and 'Done' lists on the boards
+
+Recently fetched boards are kept in a cache, which is cleared for a board
+whenever an item on it is changed (see `todo_app.data.board_cache`).
+
+The items can be spread over several boards used as shards. Item IDs encode
+the shard of the item, so operations on a single item go straight to the
+board that holds it (see `todo_app.data.sharding`).
 
 The module uses the Trello API to perform these actions, and it translates
 Trello cards into a specific item dictionary format, including the title,
 ID, and status.
 
-The following constants are used to configure the Trello board, lists, and
-authentication:
-- TRELLO_API_KEY: The API key for Trello
-- TRELLO_API_TOKEN: The API token for Trello
-- TRELLO_BOARD_ID: The ID of the Trello board to be used
+The Trello board, lists, and authentication are configured through the
+settings returned by `get_trello_config` (see `todo_app.data.trello_config`).
+The following constants are used to build the Trello API URLs:
 - TRELLO_API_BASE_URL: The base URL for the Trello API
 """
 
 
+from collections import namedtuple
+from dataclasses import replace
+
 import requests
-import os
 
+from todo_app.data.board_cache import get_board_cache
 from todo_app.data.item import Item
-
-
-def TRELLO_API_KEY():
-    return os.getenv("TRELLO_API_KEY")
-
-
-def TRELLO_API_TOKEN():
-    return os.getenv("TRELLO_API_TOKEN")
-
-
-def TRELLO_BOARD_ID():
-    return os.getenv("TRELLO_BOARD_ID")
+from todo_app.data.sharding import (
+    choose_shard, decode_item_id, encode_item_id, map_concurrently
+)
+from todo_app.data.trello_config import get_trello_config
 
 
 TRELLO_API_BASE_URL = "https://api.trello.com/1/"
 BOARDS_URL_PATH = "boards/"
 LISTS_URL_PATH = "lists/"
 CARDS_URL_PATH = "cards/"
+MEMBERS_URL_PATH = "members/"
+BATCH_URL_PATH = "batch"
+
+# The most requests Trello accepts in a single batch request
+TRELLO_BATCH_LIMIT = 10
 
+# The outcome of fetching one item in a batch: the item, or the error raised
+# fetching it
+BatchItemResult = namedtuple('BatchItemResult', ['id', 'item', 'error'])
 
-def create_base_payload():
-    return {"key": TRELLO_API_KEY(), "token": TRELLO_API_TOKEN()}
+
+def create_base_payload(config=None):
+    config = config or get_trello_config()
+    return {"key": config.api_key, "token": config.api_token}
 
 
 def create_board(board_name):
@@ -76,6 +90,33 @@ def create_board(board_name):
     return trello_board
 
 
+def get_boards():
+    """
+    Fetches the open boards of the member that owns the Trello API token.
+
+    Returns:
+        list: The boards, each with its ID and name, or raises an exception
+        if the request is unsuccessful.
+    """
+
+    # Prepare the payload with the Trello API key and token
+    payload = create_base_payload()
+    payload['filter'] = 'open'
+    payload['fields'] = 'name'
+
+    url = TRELLO_API_BASE_URL + MEMBERS_URL_PATH + 'me/' + BOARDS_URL_PATH[:-1]
+    r = requests.get(url, params=payload)
+
+    # Check if the request was successful
+    if r.status_code == requests.codes.ok:
+        trello_boards = r.json()
+    else:
+        # Raise an exception if the response is unsuccessful
+        r.raise_for_status()
+
+    return trello_boards
+
+
 def delete_board(id):
     """
     Deletes an existing board with the specified ID from Trello.
@@ -103,13 +144,16 @@ def delete_board(id):
         r.raise_for_status()
 
 
-def create_list_on_board(list_name, board_id):
+def create_list_on_board(list_name, board_id, position=None):
     """
     Creates a new list on Trello with the specified name.
 
     Args:
         list_name: The name of the list to create.
         board_id: The ID of the board on which to create the list.
+        position: Where to place the list on the board, either 'top',
+            'bottom' or a positive number. Trello places new lists at the
+            top by default.
 
     Returns:
         dict: The list that was created, or raises an exception if the list
@@ -119,6 +163,8 @@ def create_list_on_board(list_name, board_id):
     # Prepare the payload with the Trello API key and token
     payload = create_base_payload()
     payload['name'] = list_name
+    if position is not None:
+        payload['pos'] = position
 
     # Send the POST request to create the list
     url = (
@@ -137,82 +183,419 @@ def create_list_on_board(list_name, board_id):
     return trello_list
 
 
-def get_items():
+def get_lists_on_board(board_id, config=None):
     """
-    Fetch all to-do items (cards) for the specified board.
+    Fetches the open lists on the board with the specified ID.
+
+    Args:
+        board_id: The ID of the board.
+        config (TrelloConfig): The settings holding the credentials to use,
+            which default to the current settings.
 
     Returns:
-        list: The list of items from board, or raises an exception if the
-        request is unsuccessful.
+        list: The lists on the board, or raises an exception if the request
+        is unsuccessful.
     """
 
-    items = []
     # Prepare the payload with the Trello API key and token
-    payload = create_base_payload()
-    url = (TRELLO_API_BASE_URL + BOARDS_URL_PATH + TRELLO_BOARD_ID() +
+    payload = create_base_payload(config)
+    url = (
+        TRELLO_API_BASE_URL + BOARDS_URL_PATH + board_id + '/'
+        + LISTS_URL_PATH[:-1]
+    )
+    r = requests.get(url, params=payload)
+
+    # Check if the request was successful
+    if r.status_code == requests.codes.ok:
+        trello_lists = r.json()
+    else:
+        # Raise an exception if the response is unsuccessful
+        r.raise_for_status()
+
+    return trello_lists
+
+
+def discover_list_ids(config):
+    """
+    Fills in any missing list IDs in the settings by looking up the 'To Do',
+    'Doing' and 'Done' lists on each configured board by name. List IDs
+    held by the board cache, such as those restored from a snapshot, are
+    used first. One request is made per board still missing list IDs, with
+    the boards looked up concurrently, and the IDs found are kept in the
+    board cache.
+
+    Args:
+        config (TrelloConfig): The settings to complete.
+
+    Returns:
+        TrelloConfig: The settings with every list ID set.
+    """
+    if config.has_list_ids:
+        return config
+
+    board_cache = get_board_cache()
+    boards = []
+    for board in config.boards:
+        cached_list_ids = board_cache.list_ids(config.tenant_id, board.board_id)
+        boards.append(replace(board, **{
+            name: list_id for name, list_id in (cached_list_ids or {}).items()
+            if not getattr(board, name)
+        }))
+
+    boards = map_concurrently(
+        lambda board: board if board.has_list_ids else board.with_list_ids(
+            get_lists_on_board(board.board_id, config)
+        ),
+        boards
+    )
+    for board in boards:
+        board_cache.put_list_ids(
+            config.tenant_id, board.board_id, board.list_ids
+        )
+    return replace(config, boards=tuple(boards))
+
+
+def translate_trello_card_to_item(trello_card, shard):
+    """
+    Translates a Trello card on the specified shard to an item whose ID
+    encodes the shard.
+
+    Args:
+        trello_card (dict): The Trello card data.
+        shard (int): The shard holding the card.
+
+    Returns:
+        item: The translated item.
+    """
+    return Item.translate_trello_card_to_item(
+        {**trello_card, 'id': encode_item_id(shard, trello_card['id'])}
+    )
+
+
+def fetch_board_cards(board_id, config):
+    """
+    Fetch all cards on the specified board from Trello.
+
+    Args:
+        board_id: The ID of the board.
+        config (TrelloConfig): The settings holding the credentials to use.
+
+    Returns:
+        list: The cards on the board, or raises an exception if the request
+        is unsuccessful.
+    """
+    trello_cards = []
+    # Prepare the payload with the Trello API key and token
+    payload = create_base_payload(config)
+    url = (TRELLO_API_BASE_URL + BOARDS_URL_PATH + board_id +
            '/' + CARDS_URL_PATH[:-1])
     r = requests.get(url, params=payload)
 
     # Check if the request was successful and the response contains JSON data
     if r.status_code == requests.codes.ok and r.json():
         trello_cards = r.json()
-        items = [
-            Item.translate_trello_card_to_item(card) for card in trello_cards
-        ]
     else:
         # Raise an exception if the response is unsuccessful
         r.raise_for_status()
 
-    return items
+    return trello_cards
 
 
-def get_item(id):
+def fetch_board_card(board_id, card_id):
     """
-    Fetches the saved item (card) with the specified ID from specified board.
+    Fetches a card through the board it should be on, so cards on any other
+    board, including the boards of other tenants, are never returned.
 
     Args:
-        id: The ID of the item.
+        board_id: The ID of the board.
+        card_id: The ID of the card.
 
     Returns:
-        item: The saved item, or raises an exception if the item is not found.
+        dict: The Trello card, or raises an exception if the card is not on
+        the board.
     """
     # Prepare the payload with the Trello API key and token
     payload = create_base_payload()
-    url = TRELLO_API_BASE_URL + CARDS_URL_PATH + id
+    url = (TRELLO_API_BASE_URL + BOARDS_URL_PATH + board_id + '/'
+           + CARDS_URL_PATH + card_id)
     r = requests.get(url, params=payload)
 
     # Check if the request was successful and the response contains JSON data
     if r.status_code == requests.codes.ok and r.json():
-        trello_card = r.json()
-        item = Item.translate_trello_card_to_item(trello_card)
-    else:
-        # Raise an exception if the response is unsuccessful
-        r.raise_for_status()
+        return r.json()
 
-    return item
+    # Raise an exception if the response is unsuccessful
+    r.raise_for_status()
+    raise requests.HTTPError(
+        f"Card {card_id} was not found on board {board_id}.", response=r
+    )
+
+
+def refresh_board_cards(tenant_id, board_id, config=None):
+    """
+    Fetch all cards on the specified board from Trello and replace the
+    cached cards of the board with them, unless the board is invalidated
+    while it is being fetched.
+
+    Args:
+        tenant_id: The ID of the tenant using the board.
+        board_id: The ID of the board.
+        config (TrelloConfig): The settings holding the credentials to use,
+            which default to the current settings.
+
+    Returns:
+        list: The cards on the board, or raises an exception if the request
+        is unsuccessful.
+    """
+    board_cache = get_board_cache()
+    generation = board_cache.generation(tenant_id, board_id)
+    trello_cards = fetch_board_cards(board_id, config or get_trello_config())
+    board_cache.put(tenant_id, board_id, trello_cards, generation)
+    return trello_cards
+
+
+def get_board_cards(board_id, config):
+    """
+    Fetch all cards on the specified board, using the cached cards if they
+    are recent enough.
+
+    Args:
+        board_id: The ID of the board.
+        config (TrelloConfig): The settings of the tenant using the board.
+
+    Returns:
+        list: The cards on the board, or raises an exception if the request
+        is unsuccessful.
+    """
+    trello_cards = get_board_cache().get(config.tenant_id, board_id)
+    if trello_cards is None:
+        trello_cards = refresh_board_cards(config.tenant_id, board_id, config)
+    return trello_cards
+
+
+def get_board_items(shard, config=None):
+    """
+    Fetch all to-do items (cards) from the board used as the specified shard.
+
+    Args:
+        shard (int): The shard to fetch the items from.
+        config (TrelloConfig): The settings holding the shard, which default
+            to the current settings.
+
+    Returns:
+        list: The list of items from board, or raises an exception if the
+        request is unsuccessful.
+    """
+    config = config or get_trello_config()
+    board = config.board_for_shard(shard)
+    return [
+        translate_trello_card_to_item(card, shard)
+        for card in get_board_cards(board.board_id, config)
+    ]
+
+
+def get_items():
+    """
+    Fetch all to-do items (cards) from every board. The boards are fetched
+    concurrently and their items merged in the order of the boards.
+
+    Returns:
+        list: The list of items from the boards, or raises an exception if
+        a request is unsuccessful.
+    """
+    # The settings are passed on explicitly, as the boards are fetched on
+    # other threads, outside of the current request
+    config = get_trello_config()
+    return [
+        item for items in map_concurrently(
+            lambda shard: get_board_items(shard, config),
+            range(len(config.boards))
+        )
+        for item in items
+    ]
+
+
+def invalidate_shard(shard):
+    """
+    Removes the cached cards of the board used as the specified shard, so
+    changes made to it are seen on the next read.
+
+    Args:
+        shard (int): The shard that changed.
+    """
+    config = get_trello_config()
+    board = config.board_for_shard(shard)
+    get_board_cache().invalidate(config.tenant_id, board.board_id)
+
+
+def get_item(id):
+    """
+    Fetches the saved item (card) with the specified ID from the board that
+    holds it.
+
+    Args:
+        id: The ID of the item.
+
+    Returns:
+        item: The saved item, or raises an exception if the item is not found.
+    """
+    shard, card_id = decode_item_id(id)
+    board = get_trello_config().board_for_shard(shard)
+    trello_card = fetch_board_card(board.board_id, card_id)
+    return translate_trello_card_to_item(trello_card, shard)
+
+
+
+def check_card_owner(shard, card_id):
+    """
+    Checks that a card can be changed through the specified shard before
+    anything is sent to Trello. When the app serves several tenants, the
+    card must also be on the board of the shard, so cards on the boards of
+    other tenants cannot be changed; with a single tenant, every card the
+    token can reach is its own, so Trello is not asked.
+
+    Args:
+        shard (int): The shard the card is changed through.
+        card_id: The ID of the card.
+
+    Returns:
+        TrelloBoard: The board of the shard, or raises a ValueError if there
+        is no such shard, or an exception if the card is not on the board.
+    """
+    config = get_trello_config()
+    board = config.board_for_shard(shard)
+    if config.tenant_id is not None:
+        fetch_board_card(board.board_id, card_id)
+    return board
+
+def get_batch_of_items(ids, config):
+    """
+    Fetches up to TRELLO_BATCH_LIMIT items (cards) with a single request to
+    the Trello batch endpoint. Each card is read through the board of its
+    shard, so cards on any other board come back as errors.
+
+    Args:
+        ids (list): The IDs of the items.
+        config (TrelloConfig): The settings holding the boards of the items.
+
+    Returns:
+        list: A BatchItemResult for each ID, in the order of the IDs.
+    """
+    results = [None] * len(ids)
+    requested = []
+    for index, id in enumerate(ids):
+        shard, card_id = decode_item_id(id)
+        try:
+            board = config.board_for_shard(shard)
+        except ValueError as error:
+            results[index] = BatchItemResult(id, None, error)
+        else:
+            requested.append((index, id, shard, board.board_id, card_id))
+
+    if requested:
+        # Prepare the payload with the Trello API key and token
+        payload = create_base_payload(config)
+        payload['urls'] = ','.join(
+            '/' + BOARDS_URL_PATH + board_id + '/' + CARDS_URL_PATH + card_id
+            for _, _, _, board_id, card_id in requested
+        )
+        try:
+            r = requests.get(TRELLO_API_BASE_URL + BATCH_URL_PATH,
+                             params=payload)
+            if r.status_code != requests.codes.ok:
+                # Raise an exception if the response is unsuccessful
+                r.raise_for_status()
+            responses = r.json()
+            if len(responses) != len(requested):
+                raise requests.RequestException(
+                    f"Trello answered {len(responses)} of the "
+                    f"{len(requested)} requests in the batch."
+                )
+        except requests.RequestException as error:
+            # A failed batch fails every item in it, but not the other batches
+            responses = [error] * len(requested)
+
+        for (index, id, shard, _, card_id), response in zip(requested,
+                                                           responses):
+            if isinstance(response, Exception):
+                results[index] = BatchItemResult(id, None, response)
+            elif str(requests.codes.ok) in response:
+                trello_card = response[str(requests.codes.ok)]
+                results[index] = BatchItemResult(
+                    id, translate_trello_card_to_item(trello_card, shard), None
+                )
+            else:
+                # Trello reports failed reads either as the status code
+                # mapped to a message or as an error object
+                status_code, message = (
+                    response.get('statusCode'), response.get('message')
+                )
+                if status_code is None and len(response) == 1:
+                    status_code, message = next(iter(response.items()))
+                results[index] = BatchItemResult(id, None, requests.HTTPError(
+                    f"{status_code} error fetching card {card_id}: {message}"
+                ))
+
+    return results
+
+
+def get_items_by_ids(ids):
+    """
+    Fetches several items (cards) by ID using the Trello batch endpoint.
+    The IDs are split into batches of TRELLO_BATCH_LIMIT, which are fetched
+    concurrently.
+
+    Args:
+        ids (list): The IDs of the items.
+
+    Returns:
+        list: A BatchItemResult for each ID, in the order of the IDs, holding
+        either the item or the error raised fetching it.
+    """
+    # The settings are passed on explicitly, as the batches are fetched on
+    # other threads, outside of the current request
+    config = get_trello_config()
+    ids = list(ids)
+    batches = [
+        ids[start:start + TRELLO_BATCH_LIMIT]
+        for start in range(0, len(ids), TRELLO_BATCH_LIMIT)
+    ]
+    return [
+        result for results in map_concurrently(
+            lambda batch: get_batch_of_items(batch, config), batches
+        )
+        for result in results
+    ]
 
 
 def add_item(item):
     """
-    Adds a new item (card) with the specified title to the to-do list.
+    Adds a new item (card) with the specified title to the to-do list. The
+    board the item is added to is chosen by the placement policy in the
+    settings.
 
     Returns:
         item: Saved item, or raises an exception if the item is not saved.
     """
+    config = get_trello_config()
+    shard = choose_shard(item, config.placement, len(config.boards))
+    board = config.board_for_shard(shard)
+
     # Prepare the payload with the Trello API key and token
     payload = create_base_payload()
-    payload['idList'] = item.id_list
+    payload['idList'] = board.list_id_for_status(item.status)
     payload['name'] = item.title
     payload['desc'] = item.description
     payload['due'] = item.due_date
 
     url = TRELLO_API_BASE_URL + CARDS_URL_PATH[:-1]
     r = requests.post(url, params=payload)
+    invalidate_shard(shard)
 
     # Check if the request was successful and the response contains JSON data
     if r.status_code == requests.codes.ok and r.json():
         trello_card = r.json()
-        item = Item.translate_trello_card_to_item(trello_card)
+        item = translate_trello_card_to_item(trello_card, shard)
     else:
         # Raise an exception if the response is unsuccessful
         r.raise_for_status()
@@ -232,6 +615,8 @@ def save_item(item):
         dict: The updated item, or raises an exception if the item is not
         updated.
     """
+    shard, card_id = decode_item_id(item.id)
+    check_card_owner(shard, card_id)
 
     # Prepare the payload with the Trello API key and token
     payload = create_base_payload()
@@ -241,13 +626,14 @@ def save_item(item):
     payload['idList'] = item.id_list
 
     # Send the PUT request to update the card
-    url = TRELLO_API_BASE_URL + CARDS_URL_PATH + item.id
+    url = TRELLO_API_BASE_URL + CARDS_URL_PATH + card_id
     r = requests.put(url, params=payload)
+    invalidate_shard(shard)
 
     # Check if the request was successful and the response contains JSON data
     if r.status_code == requests.codes.ok and r.json():
         trello_card = r.json()
-        updated_item = Item.translate_trello_card_to_item(trello_card)
+        updated_item = translate_trello_card_to_item(trello_card, shard)
     else:
         # Raise an exception if the response is unsuccessful
         r.raise_for_status()
@@ -258,7 +644,7 @@ def save_item(item):
 def delete_item(id):
     """
     Deletes an existing item (card) with the specified ID from the Trello
-    board.
+    board that holds it.
 
     Args:
         id: The ID of the item to delete.
@@ -267,13 +653,16 @@ def delete_item(id):
         bool: True if the deletion was successful, or raises an exception if
         the deletion is unsuccessful.
     """
+    shard, card_id = decode_item_id(id)
+    check_card_owner(shard, card_id)
 
     # Prepare the payload with the Trello API key and token
     payload = create_base_payload()
 
     # Send the DELETE request to remove the card
-    url = TRELLO_API_BASE_URL + CARDS_URL_PATH + id
+    url = TRELLO_API_BASE_URL + CARDS_URL_PATH + card_id
     r = requests.delete(url, params=payload)
+    invalidate_shard(shard)
 
     # Check if the request was successful (status code 200)
     if r.status_code == requests.codes.ok:
@@ -0,0 +1,147 @@
+"""
+This module provisions the Trello boards that store the to-do items. It
+includes the ability to:
+
+- Create a board with "To Do", "Doing" and "Done" lists, reusing a board and
+  lists that already exist with the same names, so it is safe to run again
+  after a partial failure
+- Provision several boards in one run, for example one per environment
+- Write the IDs of the provisioned boards to a .env or JSON file atomically
+
+Boards and their lists are created concurrently. Every request goes through
+a shared `RateLimiter`, which keeps the run within Trello's rate limits and
+backs off when Trello responds with HTTP 429.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from todo_app.atomic_file import write_file_atomically
+from todo_app.data.rate_limiter import RateLimiter, call_with_rate_limit
+from todo_app.data.trello_config import LIST_ID_FIELDS_BY_NAME
+from todo_app.data.trello_items import (
+    get_boards, create_board, get_lists_on_board, create_list_on_board
+)
+
+# The lists every board needs, in the order they appear on the board
+LIST_NAMES = list(LIST_ID_FIELDS_BY_NAME)
+
+MAX_WORKERS = 8
+
+
+def provision_board(board_name, limiter, existing_boards=None):
+    """
+    Makes sure a board with the specified name exists and has the lists the
+    app needs, creating whatever is missing. Missing lists are created
+    concurrently.
+
+    Args:
+        board_name: The name of the board.
+        limiter (RateLimiter): The limiter shared by every request.
+        existing_boards (list): The open boards of the member, if they have
+            already been fetched.
+
+    Returns:
+        dict: The board ID and the IDs of its lists by name.
+    """
+    if existing_boards is None:
+        existing_boards = call_with_rate_limit(limiter, get_boards)
+
+    board = next(
+        (board for board in existing_boards if board['name'] == board_name),
+        None
+    )
+    if board is None:
+        board = call_with_rate_limit(limiter, create_board, board_name)
+        existing_lists = []
+    else:
+        existing_lists = call_with_rate_limit(
+            limiter, get_lists_on_board, board['id']
+        )
+
+    list_ids = {}
+    for trello_list in existing_lists:
+        if trello_list['name'] in LIST_NAMES:
+            list_ids.setdefault(trello_list['name'], trello_list['id'])
+
+    missing_names = [name for name in LIST_NAMES if name not in list_ids]
+    if missing_names:
+        with ThreadPoolExecutor(max_workers=len(missing_names)) as executor:
+            new_lists = executor.map(
+                lambda name: call_with_rate_limit(
+                    limiter, create_list_on_board, name, board['id'],
+                    LIST_NAMES.index(name) + 1
+                ),
+                missing_names
+            )
+            for name, new_list in zip(missing_names, new_lists):
+                list_ids[name] = new_list['id']
+
+    return {'board_id': board['id'], 'lists': list_ids}
+
+
+def provision_boards(board_names, limiter=None, max_workers=MAX_WORKERS):
+    """
+    Provisions several boards concurrently. The member's boards are fetched
+    once and shared by every board being provisioned. Each name is only
+    provisioned once, however many times it is listed.
+
+    Args:
+        board_names (list): The names of the boards.
+        limiter (RateLimiter): The limiter shared by every request, which
+            defaults to one within Trello's per-token limit.
+        max_workers (int): The number of boards provisioned at once.
+
+    Returns:
+        dict: The result of `provision_board` for each board name.
+    """
+    # Provisioning the same name on two threads at once would create it twice
+    board_names = list(dict.fromkeys(board_names))
+    limiter = limiter or RateLimiter()
+    existing_boards = call_with_rate_limit(limiter, get_boards)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda name: provision_board(name, limiter, existing_boards),
+            board_names
+        )
+        return dict(zip(board_names, results))
+
+
+def update_env_file(env_file_path, values):
+    """
+    Sets variables in a .env file, keeping every other line as it is.
+    Variables that are not in the file yet are appended to it.
+
+    Args:
+        env_file_path: The path of the .env file.
+        values (dict): The values of the variables by name.
+    """
+    with open(env_file_path, 'r') as file:
+        env_content = file.readlines()
+
+    remaining = dict(values)
+    new_content = []
+    for line in env_content:
+        name = line.split('=', 1)[0].strip()
+        if '=' in line and not line.lstrip().startswith('#') \
+                and name in remaining:
+            line = f"{name}={remaining.pop(name)}\n"
+        new_content.append(line)
+
+    if new_content and not new_content[-1].endswith('\n'):
+        new_content[-1] += '\n'
+    new_content.extend(f"{name}={value}\n" for name, value in remaining.items())
+
+    write_file_atomically(env_file_path, ''.join(new_content))
+
+
+def write_json_file(file_path, data):
+    """
+    Writes data to a JSON file atomically.
+
+    Args:
+        file_path: The path of the JSON file.
+        data: The data to write.
+    """
+    write_file_atomically(file_path, json.dumps(data, indent=4) + '\n')
@@ -1,5 +1,7 @@
 import os
 
+from todo_app.data.trello_config import TrelloConfig
+
 
 class Config:
     def __init__(self):
@@ -7,3 +9,69 @@ class Config:
         self.SECRET_KEY = os.environ.get('SECRET_KEY')
         if not self.SECRET_KEY:
             raise ValueError("No SECRET_KEY set for Flask application. Did you follow the setup instructions?")
+
+        # Trello settings, read once and shared by every request. When a
+        # tenants file is given, each tenant uses its own boards instead.
+        self.TRELLO_TENANTS_FILE = os.environ.get('TRELLO_TENANTS_FILE')
+        self.TRELLO_CONFIG = TrelloConfig.from_env().validate(
+            require_boards=not self.TRELLO_TENANTS_FILE
+        )
+        self.TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant-ID')
+        # The tenant header is only trusted on requests carrying the secret
+        # shared with the proxy that signs users in
+        self.TENANT_PROXY_SECRET = os.environ.get('TENANT_PROXY_SECRET')
+        self.TENANT_PROXY_SECRET_HEADER = os.environ.get(
+            'TENANT_PROXY_SECRET_HEADER', 'X-Tenant-Proxy-Secret'
+        )
+        if self.TRELLO_TENANTS_FILE and not self.TENANT_PROXY_SECRET:
+            raise ValueError("No TENANT_PROXY_SECRET set for Flask application. It is needed when TRELLO_TENANTS_FILE is set.")
+        self.TENANT_CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', 256))
+
+        # Cache of the cards on each board
+        self.BOARD_CACHE_TTL = float(os.environ.get('BOARD_CACHE_TTL', 10))
+        self.BOARD_CACHE_MAX_BYTES = int(
+            os.environ.get('BOARD_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        )
+
+        # Snapshots of the board cache, kept on disk for warm restarts
+        self.BOARD_SNAPSHOT_PATH = os.environ.get('BOARD_SNAPSHOT_PATH')
+        self.BOARD_SNAPSHOT_INTERVAL = float(
+            os.environ.get('BOARD_SNAPSHOT_INTERVAL', 60)
+        )
+        self.BOARD_SNAPSHOT_RECONCILE_JITTER = float(
+            os.environ.get('BOARD_SNAPSHOT_RECONCILE_JITTER', 5)
+        )
+
+        # Server-side store of the items used by session_items
+        self.SESSION_ITEMS_DATABASE = os.environ.get(
+            'SESSION_ITEMS_DATABASE', 'session_items.sqlite3'
+        )
+        self.SESSION_ITEMS_CACHE_SIZE = int(
+            os.environ.get('SESSION_ITEMS_CACHE_SIZE', 1024)
+        )
+        self.SESSION_ITEMS_MAX_AGE = float(
+            os.environ.get('SESSION_ITEMS_MAX_AGE', 30 * 24 * 60 * 60)
+        )
+
+        # Response compression
+        self.COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+        self.COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+        self.COMPRESS_CACHE_MAX_BYTES = int(
+            os.environ.get('COMPRESS_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+        )
+
+        # Opt-in profiling of individual requests
+        self.PROFILING_ENABLED = os.environ.get(
+            'PROFILING_ENABLED', ''
+        ).lower() in ('1', 'true', 'yes')
+        self.PROFILING_HEADER = os.environ.get(
+            'PROFILING_HEADER', 'X-Profile-Token'
+        )
+        self.PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+        self.PROFILING_SAMPLE_RATE = float(
+            os.environ.get('PROFILING_SAMPLE_RATE', 0)
+        )
+        self.PROFILING_DIR = os.environ.get('PROFILING_DIR', 'profiles')
+        self.PROFILING_MAX_BYTES = int(
+            os.environ.get('PROFILING_MAX_BYTES', 50 * 1024 * 1024)
+        )
@@ -0,0 +1,121 @@
+"""
+LRUCache Class
+
+This class provides a small, thread-safe least-recently-used cache that is
+bounded by the combined size of its values rather than by a fixed number of
+entries. The size of each value is measured with the `sizeof` callable given
+to the constructor, which defaults to counting every value as 1 (making the
+bound a simple entry count). The optional `on_evict` callable is called with
+the key and value of every entry evicted to make room, and of every value
+too large to be stored.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    def __init__(self, max_size, sizeof=None, on_evict=None):
+        """Initialize an empty cache that holds at most `max_size` units."""
+        self._max_size = max_size
+        self._sizeof = sizeof or (lambda value: 1)
+        self._on_evict = on_evict or (lambda key, value: None)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    @property
+    def size(self):
+        """
+        Returns the combined size of the cached values.
+
+        Returns:
+            int: The size of the cache contents.
+        """
+        return self._size
+
+    def get(self, key, default=None):
+        """
+        Fetches the value stored under the specified key and marks it as the
+        most recently used entry.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if the key is not cached.
+
+        Returns:
+            The cached value, or `default` if the key is not cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """
+        Stores the value under the specified key, evicting the least recently
+        used entries until the cache fits within its maximum size. Values that
+        are larger than the whole cache are not stored.
+
+        Args:
+            key: The key of the entry.
+            value: The value to cache.
+        """
+        value_size = self._sizeof(value)
+        with self._lock:
+            self._discard(key)
+            if value_size > self._max_size:
+                self._on_evict(key, value)
+                return
+            self._entries[key] = (value, value_size)
+            self._size += value_size
+            while self._size > self._max_size:
+                evicted_key = next(iter(self._entries))
+                self._on_evict(evicted_key, self._entries[evicted_key][0])
+                self._discard(evicted_key)
+
+    def pop(self, key, default=None):
+        """
+        Removes the entry stored under the specified key.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if the key is not cached.
+
+        Returns:
+            The removed value, or `default` if the key is not cached.
+        """
+        with self._lock:
+            value = self._entries.get(key, (default,))[0]
+            self._discard(key)
+            return value
+
+    def items(self):
+        """
+        Returns the cached entries, from the least to the most recently used.
+
+        Returns:
+            list: The keys and values of the entries.
+        """
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,241 @@
+"""
+This module provides opt-in profiling of individual requests to the Flask
+app, to find out why a specific request is slow in production. A request is
+profiled when it carries the profiling token in the profiling header, or
+when it is picked at random at the configured sample rate.
+
+Profiled requests are profiled end to end, from the moment the app receives
+them until their response body has been produced: calls to Trello, item
+translation, view model filtering and template rendering. Two files are
+written for each profiled request:
+
+- A `.prof` file with the cProfile statistics, for use with `pstats` or
+  tools such as snakeviz
+- A `.folded` file with the call stacks sampled during the request, one
+  collapsed stack per line, for use with flame graph tools
+
+Work done by the request on other threads, such as fetching several boards
+concurrently, is not included in the profile.
+
+Only one request is profiled at a time, as Python cannot run two profilers
+at once; requests arriving while another is being profiled are served
+without profiling. Profiling never fails a request: errors writing the
+profile are logged and the response is returned as usual.
+
+The oldest profiles are deleted when the files in the profile directory
+take up more than the configured number of bytes. When profiling is
+disabled the app is not wrapped at all, so it costs nothing.
+
+The following configuration values are used:
+- PROFILING_ENABLED: Whether requests can be profiled
+- PROFILING_HEADER: The request header carrying the profiling token
+- PROFILING_TOKEN: The token authorising a request to be profiled
+- PROFILING_SAMPLE_RATE: The fraction of requests profiled at random
+- PROFILING_DIR: The directory the profiles are written to
+- PROFILING_MAX_BYTES: The space the profiles may take up
+"""
+
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter
+from threading import Event, Lock, Thread, get_ident
+
+PROFILE_EXTENSIONS = ('.prof', '.folded')
+STACK_SAMPLE_INTERVAL_IN_SECONDS = 0.005
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval=STACK_SAMPLE_INTERVAL_IN_SECONDS):
+        """Initialize a sampler of the call stack of the given thread."""
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stacks = Counter()
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start sampling the call stack."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling the call stack."""
+        self._stopped.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+
+    def collapsed_stacks(self):
+        """
+        Returns the sampled stacks in the collapsed format used by flame
+        graph tools: the frames from the outermost in, separated by
+        semicolons, followed by the number of samples.
+
+        Returns:
+            str: One line per distinct stack.
+        """
+        return ''.join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in self._stacks.most_common()
+        )
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} "
+                    f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self._stacks[tuple(reversed(stack))] += 1
+
+
+class RequestProfiler:
+    def __init__(self, wsgi_app, profile_dir, token=None,
+                 header='X-Profile-Token', sample_rate=0.0,
+                 max_bytes=50 * 1024 * 1024):
+        """Initialize a profiler of the requests to the given WSGI app."""
+        self._wsgi_app = wsgi_app
+        self._profile_dir = profile_dir
+        self._token = token
+        self._environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        self._sample_rate = sample_rate
+        self._max_bytes = max_bytes
+        self._lock = Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Wraps the app so its requests can be profiled, if profiling is
+        enabled in the app configuration.
+
+        Args:
+            app: The Flask app.
+
+        Returns:
+            RequestProfiler: The profiler, or None if profiling is disabled.
+        """
+        if not app.config['PROFILING_ENABLED']:
+            return None
+
+        profiler = cls(
+            app.wsgi_app,
+            app.config['PROFILING_DIR'],
+            token=app.config['PROFILING_TOKEN'],
+            header=app.config['PROFILING_HEADER'],
+            sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+            max_bytes=app.config['PROFILING_MAX_BYTES']
+        )
+        app.wsgi_app = profiler
+        return profiler
+
+    def should_profile(self, environ):
+        """
+        Decides whether to profile a request.
+
+        Args:
+            environ (dict): The WSGI environment of the request.
+
+        Returns:
+            bool: True if the request carries the profiling token or is
+            picked at random, False otherwise.
+        """
+        header_token = environ.get(self._environ_key)
+        if self._token and header_token:
+            return hmac.compare_digest(header_token, self._token)
+        return random.random() < self._sample_rate
+
+    def __call__(self, environ, start_response):
+        # Requests arriving while another is profiled are served unprofiled
+        if not self.should_profile(environ) or not self._lock.acquire(
+                blocking=False):
+            return self._wsgi_app(environ, start_response)
+
+        try:
+            return self._profile_request(environ, start_response)
+        finally:
+            self._lock.release()
+
+    def _profile_request(self, environ, start_response):
+        profile_name = self._profile_name(environ)
+        profile = cProfile.Profile()
+        sampler = StackSampler(get_ident())
+
+        def start_profiled_response(status, headers, exc_info=None):
+            headers.append(('X-Profile-Id', profile_name))
+            return start_response(status, headers, exc_info)
+
+        try:
+            sampler.start()
+            profile.enable()
+            # Produce the whole body while profiling, so lazily rendered
+            # responses are included in the profile
+            response = self._wsgi_app(environ, start_profiled_response)
+            try:
+                body = list(response)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            profile.disable()
+            sampler.stop()
+            try:
+                self._write_profile(profile_name, profile, sampler)
+            except Exception:
+                logger.warning("Could not write profile %s", profile_name,
+                               exc_info=True)
+
+        return body
+
+    def _profile_name(self, environ):
+        path = re.sub(r'[^A-Za-z0-9]+', '-', environ.get('PATH_INFO', ''))
+        return (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-"
+            f"{environ.get('REQUEST_METHOD', '')}{path.rstrip('-')}-"
+            f"{uuid.uuid4().hex[:8]}"
+        )
+
+    def _write_profile(self, profile_name, profile, sampler):
+        os.makedirs(self._profile_dir, exist_ok=True)
+        profile_path = os.path.join(self._profile_dir, profile_name)
+        profile.dump_stats(profile_path + '.prof')
+        with open(profile_path + '.folded', 'w') as file:
+            file.write(sampler.collapsed_stacks())
+        enforce_retention(self._profile_dir, self._max_bytes)
+
+
+def enforce_retention(profile_dir, max_bytes):
+    """
+    Deletes the oldest profiles until the profiles in the directory take up
+    no more than the specified number of bytes.
+
+    Args:
+        profile_dir: The directory holding the profiles.
+        max_bytes (int): The space the profiles may take up.
+    """
+    profiles = []
+    for entry in os.scandir(profile_dir):
+        if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS):
+            stat = entry.stat()
+            profiles.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in profiles)
+    for _, size, path in sorted(profiles):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
@@ -6,6 +6,8 @@ import pytest
 from dotenv import find_dotenv, load_dotenv
 from selenium import webdriver
 
+from todo_app.data.board_cache import set_board_cache
+from todo_app.data.trello_config import set_trello_config
 from todo_app.data.trello_items import create_board, delete_board
 from todo_app.data.view_model import ViewModel
 from todo_app.data.item import Item
@@ -14,6 +16,15 @@ from todo_app import app
 TIME_IN_SECONDS = 1
 
 
+@pytest.fixture(autouse=True)
+def reset_trello_config():
+    # Stop the Trello settings and cached boards of one test's app leaking
+    # into the next test
+    yield
+    set_trello_config(None)
+    set_board_cache(None)
+
+
 @pytest.fixture
 def load_fake_environment_variables():
     # Use our test integration config instead of the 'real' version
@@ -1,6 +1,24 @@
+import gzip
+import json
+
+import pytest
 import requests
 
-from todo_app.tests.utils import stub
+from todo_app import app
+from todo_app.compression import Compressor
+from todo_app.data import session_items, trello_items
+from todo_app.data.board_cache import BoardCache
+from todo_app.data.board_snapshot import encode_snapshot
+from todo_app.data.item import Item
+from todo_app.data.session_store import SessionItemStore
+from todo_app.profiling import RequestProfiler
+from todo_app.data.trello_provisioning import provision_boards
+from todo_app.tests.utils import StubResponse, stub
+
+
+def tenant_headers(tenant_id):
+    # The headers set by the proxy that signs users in
+    return {'X-Tenant-ID': tenant_id, 'X-Tenant-Proxy-Secret': 'proxy-secret'}
 
 
 def test_index_get_route(monkeypatch, client):
@@ -14,3 +32,452 @@ def test_add_todo_item_get_route(client):
     response = client.get('/add-todo-item')
     assert response.status_code == 200
     assert 'ADD TODO ITEM' in response.data.decode()
+
+
+def test_index_get_route_is_gzip_compressed(monkeypatch, client):
+    monkeypatch.setattr(requests, 'get', stub)
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'Item Name - Test One' in gzip.decompress(response.data).decode()
+
+
+def test_identical_page_is_served_from_compression_cache(monkeypatch, client):
+    monkeypatch.setattr(requests, 'get', stub)
+    compress_calls = []
+    compress = Compressor.compress
+
+    def counting_compress(self, data, encoding):
+        compress_calls.append(encoding)
+        return compress(self, data, encoding)
+
+    monkeypatch.setattr(Compressor, 'compress', counting_compress)
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.data == first.data
+    assert compress_calls == ['gzip']
+
+
+def test_index_get_route_is_not_compressed_without_accept_encoding(
+        monkeypatch, client):
+    monkeypatch.setattr(requests, 'get', stub)
+    response = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert 'Item Name - Test One' in response.data.decode()
+
+
+def test_create_app_discovers_missing_list_ids(
+        monkeypatch, load_fake_environment_variables):
+    for name in ('TRELLO_TODO_LIST_ID', 'TRELLO_DOING_LIST_ID',
+                 'TRELLO_DONE_LIST_ID'):
+        monkeypatch.delenv(name)
+    monkeypatch.setattr(requests, 'get', stub)
+    trello_board = app.create_app().config['TRELLO_CONFIG'].boards[0]
+    assert trello_board.todo_list_id == '0000001'
+    assert trello_board.doing_list_id == '0000002'
+    assert trello_board.done_list_id == '0000003'
+
+
+def test_provision_boards_reuses_existing_boards_and_lists(
+        monkeypatch, load_fake_environment_variables):
+    created = []
+
+    def get_stub(url, params={}):
+        if url == 'https://api.trello.com/1/members/me/boards':
+            return StubResponse([{'id': 'board-1', 'name': 'Existing'}])
+        elif url == 'https://api.trello.com/1/boards/board-1/lists':
+            return StubResponse([
+                {'id': 'list-1', 'name': 'To Do'},
+                {'id': 'list-2', 'name': 'Doing'}
+            ])
+        raise Exception(f'Integration test did not expect URL "{url}"')
+
+    def post_stub(url, params={}):
+        created.append((url, params['name']))
+        if url == 'https://api.trello.com/1/boards/':
+            return StubResponse({'id': 'board-2'})
+        return StubResponse({'id': f"{params['name']}-list"})
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    monkeypatch.setattr(requests, 'post', post_stub)
+    provisioned_boards = provision_boards(['Existing', 'New', 'New'])
+
+    assert provisioned_boards['Existing'] == {
+        'board_id': 'board-1',
+        'lists': {'To Do': 'list-1', 'Doing': 'list-2', 'Done': 'Done-list'}
+    }
+    assert provisioned_boards['New'] == {
+        'board_id': 'board-2',
+        'lists': {'To Do': 'To Do-list', 'Doing': 'Doing-list',
+                  'Done': 'Done-list'}
+    }
+    assert sorted(created) == [
+        ('https://api.trello.com/1/boards/', 'New'),
+        ('https://api.trello.com/1/boards/board-1/lists', 'Done'),
+        ('https://api.trello.com/1/boards/board-2/lists', 'Doing'),
+        ('https://api.trello.com/1/boards/board-2/lists', 'Done'),
+        ('https://api.trello.com/1/boards/board-2/lists', 'To Do'),
+    ]
+
+
+def test_items_are_sharded_over_several_boards(
+        monkeypatch, load_fake_environment_variables):
+    monkeypatch.setenv('TRELLO_BOARD_IDS', 'board-a,board-b')
+    monkeypatch.setenv('TRELLO_SHARD_PLACEMENT', 'round-robin')
+    cards = {
+        'board-a': [{'id': 'card-1', 'name': 'Task A', 'idList': 'a-todo'}],
+        'board-b': [{'id': 'card-2', 'name': 'Task B', 'idList': 'b-done'}]
+    }
+    created = []
+
+    def get_stub(url, params={}):
+        board_id = url.split('/')[5]
+        if url.endswith('/lists'):
+            return StubResponse([
+                {'id': f'{board_id[-1]}-todo', 'name': 'To Do'},
+                {'id': f'{board_id[-1]}-doing', 'name': 'Doing'},
+                {'id': f'{board_id[-1]}-done', 'name': 'Done'}
+            ])
+        elif url.endswith('/cards'):
+            return StubResponse(cards[board_id])
+        elif url == 'https://api.trello.com/1/boards/board-b/cards/card-2':
+            return StubResponse(cards['board-b'][0])
+        raise Exception(f'Integration test did not expect URL "{url}"')
+
+    def post_stub(url, params={}):
+        created.append(params['idList'])
+        return StubResponse({'id': 'card-3', 'name': params['name'],
+                             'idList': params['idList']})
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    monkeypatch.setattr(requests, 'post', post_stub)
+    test_app = app.create_app()
+
+    items = trello_items.get_items()
+    assert [(item.id, item.status) for item in items] == [
+        ('0-card-1', 'To Do'), ('1-card-2', 'Done')
+    ]
+    item = trello_items.get_item('1-card-2')
+    item.mark_as_doing()
+    assert item.id_list == 'b-doing'
+
+    new_items = [
+        trello_items.add_item(Item(title=title)) for title in 'XY'
+    ]
+    assert sorted(created) == ['a-todo', 'b-todo']
+    assert {item.id.split('-')[0] for item in new_items} == {'0', '1'}
+    assert test_app.config['TRELLO_CONFIG'].placement == 'round-robin'
+
+    # IDs with an unknown shard are rejected before reaching Trello
+    monkeypatch.setattr(requests, 'put', get_stub)
+    monkeypatch.setattr(requests, 'delete', get_stub)
+    with pytest.raises(ValueError):
+        trello_items.delete_item('5-card-1')
+    with pytest.raises(ValueError):
+        trello_items.save_item(Item(id='5-card-1', title='Task A'))
+
+    # With a single tenant, items are deleted without reading them first
+    deleted_urls = []
+
+    def delete_stub(url, params={}):
+        deleted_urls.append(url)
+        return StubResponse({})
+
+    def unexpected_get_stub(url, params={}):
+        raise Exception(f'Integration test did not expect URL "{url}"')
+
+    monkeypatch.setattr(requests, 'get', unexpected_get_stub)
+    monkeypatch.setattr(requests, 'delete', delete_stub)
+    assert trello_items.delete_item('1-card-2')
+    assert deleted_urls == ['https://api.trello.com/1/cards/card-2']
+
+
+def test_each_tenant_sees_its_own_cached_board(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    tenants_file = tmp_path / 'tenants.json'
+    tenants_file.write_text(json.dumps({
+        'team-a': {'board_ids': ['board-a']},
+        'team-b': {'board_ids': ['board-b']}
+    }))
+    monkeypatch.setenv('TRELLO_TENANTS_FILE', str(tenants_file))
+    monkeypatch.setenv('TENANT_PROXY_SECRET', 'proxy-secret')
+    monkeypatch.delenv('TRELLO_BOARD_ID')
+    requested_urls = []
+
+    def get_stub(url, params={}):
+        requested_urls.append(url)
+        board_id = url.split('/')[5]
+        if url.endswith('/lists'):
+            return StubResponse([
+                {'id': f'{board_id}-{name}', 'name': name}
+                for name in ('To Do', 'Doing', 'Done')
+            ])
+        return StubResponse([{'id': 'card', 'name': f'Task on {board_id}',
+                              'idList': f'{board_id}-Doing'}])
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    with app.create_app().test_client() as client:
+        for _ in range(2):
+            response = client.get('/', headers=tenant_headers('team-a'))
+            assert 'Task on board-a' in response.data.decode()
+            assert 'Task on board-b' not in response.data.decode()
+        response = client.get('/', headers=tenant_headers('team-b'))
+        assert 'Task on board-b' in response.data.decode()
+        assert client.get('/').status_code == 403
+        response = client.get('/', headers=tenant_headers('team-c'))
+        assert response.status_code == 403
+
+    assert sorted(requested_urls) == [
+        'https://api.trello.com/1/boards/board-a/cards',
+        'https://api.trello.com/1/boards/board-a/lists',
+        'https://api.trello.com/1/boards/board-b/cards',
+        'https://api.trello.com/1/boards/board-b/lists'
+    ]
+
+
+def test_forged_tenant_header_is_rejected(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    tenants_file = tmp_path / 'tenants.json'
+    tenants_file.write_text(json.dumps({'team-a': {'board_ids': ['board-a']}}))
+    monkeypatch.setenv('TRELLO_TENANTS_FILE', str(tenants_file))
+    monkeypatch.setenv('TENANT_PROXY_SECRET', 'proxy-secret')
+    monkeypatch.delenv('TRELLO_BOARD_ID')
+
+    def get_stub(url, params={}):
+        raise Exception(f'Integration test did not expect URL "{url}"')
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    with app.create_app().test_client() as client:
+        # A client naming a tenant itself, without the proxy's secret
+        response = client.get('/', headers={'X-Tenant-ID': 'team-a'})
+        assert response.status_code == 403
+        response = client.get('/', headers={
+            'X-Tenant-ID': 'team-a', 'X-Tenant-Proxy-Secret': 'guess'
+        })
+        assert response.status_code == 403
+
+    monkeypatch.delenv('TENANT_PROXY_SECRET')
+    with pytest.raises(ValueError, match='TENANT_PROXY_SECRET'):
+        app.create_app()
+
+
+def test_tenant_cannot_change_cards_on_another_tenants_board(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    tenants_file = tmp_path / 'tenants.json'
+    tenants_file.write_text(json.dumps({
+        'team-a': {'board_ids': ['board-a']},
+        'team-b': {'board_ids': ['board-b']}
+    }))
+    monkeypatch.setenv('TRELLO_TENANTS_FILE', str(tenants_file))
+    monkeypatch.setenv('TENANT_PROXY_SECRET', 'proxy-secret')
+    monkeypatch.delenv('TRELLO_BOARD_ID')
+    changed_urls = []
+
+    def get_stub(url, params={}):
+        board_id = url.split('/')[5]
+        if url.endswith('/lists'):
+            return StubResponse([
+                {'id': f'{board_id}-{name}', 'name': name}
+                for name in ('To Do', 'Doing', 'Done')
+            ])
+        elif url == 'https://api.trello.com/1/boards/board-b/cards/card-b':
+            return StubResponse({'id': 'card-b', 'name': 'Task on board-b',
+                                 'idList': 'board-b-To Do'})
+        return StubResponse({'message': 'not found'}, status_code=404)
+
+    def change_stub(url, params={}):
+        changed_urls.append(url)
+        return StubResponse({'id': 'card-b', 'name': params.get('name'),
+                             'idList': params.get('idList')})
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    monkeypatch.setattr(requests, 'put', change_stub)
+    monkeypatch.setattr(requests, 'delete', change_stub)
+    test_app = app.create_app()
+
+    with test_app.test_request_context(headers=tenant_headers('team-a')):
+        test_app.preprocess_request()
+        with pytest.raises(requests.HTTPError):
+            trello_items.delete_item('0-card-b')
+        with pytest.raises(requests.HTTPError):
+            trello_items.save_item(Item(id='0-card-b', title='Hijacked'))
+    assert changed_urls == []
+
+    with test_app.test_request_context(headers=tenant_headers('team-b')):
+        test_app.preprocess_request()
+        assert trello_items.delete_item('0-card-b')
+    assert changed_urls == ['https://api.trello.com/1/cards/card-b']
+
+
+def test_index_is_served_from_snapshot_before_trello_is_reached(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    for name in ('TRELLO_TODO_LIST_ID', 'TRELLO_DOING_LIST_ID',
+                 'TRELLO_DONE_LIST_ID'):
+        monkeypatch.delenv(name)
+    board_cache = BoardCache(ttl=10)
+    board_cache.put(None, 'fake-board-id', [
+        {'id': 'card', 'name': 'Task from snapshot', 'idList': '0000002'}
+    ])
+    board_cache.put_list_ids(None, 'fake-board-id', {
+        'todo_list_id': '0000001', 'doing_list_id': '0000002',
+        'done_list_id': '0000003'
+    })
+    snapshot_path = tmp_path / 'boards.snapshot'
+    snapshot_path.write_bytes(encode_snapshot(board_cache, 0))
+    monkeypatch.setenv('BOARD_SNAPSHOT_PATH', str(snapshot_path))
+    monkeypatch.setenv('BOARD_SNAPSHOT_RECONCILE_JITTER', '60')
+
+    def get_stub(url, params={}):
+        raise requests.ConnectionError('trello down')
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    test_app = app.create_app()
+    with test_app.test_client() as client:
+        response = client.get('/')
+    test_app.extensions['board_snapshotter'].stop()
+
+    assert response.status_code == 200
+    assert 'Task from snapshot' in response.data.decode()
+    trello_board = test_app.config['TRELLO_CONFIG'].boards[0]
+    assert trello_board.doing_list_id == '0000002'
+
+    # Snapshots without the list IDs still let the app start
+    board_cache = BoardCache(ttl=10)
+    board_cache.put(None, 'fake-board-id', [
+        {'id': 'card', 'name': 'Task from snapshot', 'idList': '0000002'}
+    ])
+    snapshot_path.write_bytes(encode_snapshot(board_cache, 0))
+    test_app = app.create_app()
+    test_app.extensions['board_snapshotter'].stop()
+    assert not test_app.config['TRELLO_CONFIG'].has_list_ids
+
+
+def test_tenant_lists_are_restored_from_snapshot(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    tenants_file = tmp_path / 'tenants.json'
+    tenants_file.write_text(json.dumps({'team-a': {'board_ids': ['board-a']}}))
+    monkeypatch.setenv('TRELLO_TENANTS_FILE', str(tenants_file))
+    monkeypatch.setenv('TENANT_PROXY_SECRET', 'proxy-secret')
+    monkeypatch.delenv('TRELLO_BOARD_ID')
+    board_cache = BoardCache(ttl=10)
+    board_cache.put('team-a', 'board-a', [
+        {'id': 'card', 'name': 'Task from snapshot', 'idList': 'a-doing'}
+    ])
+    board_cache.put_list_ids('team-a', 'board-a', {
+        'todo_list_id': 'a-todo', 'doing_list_id': 'a-doing',
+        'done_list_id': 'a-done'
+    })
+    snapshot_path = tmp_path / 'boards.snapshot'
+    snapshot_path.write_bytes(encode_snapshot(board_cache, 0))
+    monkeypatch.setenv('BOARD_SNAPSHOT_PATH', str(snapshot_path))
+    monkeypatch.setenv('BOARD_SNAPSHOT_RECONCILE_JITTER', '60')
+
+    def get_stub(url, params={}):
+        raise Exception(f'Integration test did not expect URL "{url}"')
+
+    monkeypatch.setattr(requests, 'get', get_stub)
+    test_app = app.create_app()
+    with test_app.test_client() as client:
+        response = client.get('/', headers=tenant_headers('team-a'))
+    test_app.extensions['board_snapshotter'].stop()
+
+    assert response.status_code == 200
+    assert 'Task from snapshot' in response.data.decode()
+
+
+def test_session_items_keep_only_a_session_id_in_the_session(
+        monkeypatch, load_fake_environment_variables):
+    monkeypatch.setattr(session_items, '_session_item_store',
+                        SessionItemStore(':memory:'))
+    with app.create_app().test_request_context() as context:
+        for index in range(100):
+            session_items.add_item(f'Item {index}')
+        item = session_items.get_item(50)
+        item['status'] = 'Completed'
+        session_items.save_item(item)
+
+        assert len(session_items.get_items()) == 102
+        assert session_items.get_item('50')['status'] == 'Completed'
+        assert list(context.session.keys()) == ['items_session_id']
+
+
+def test_requests_carrying_the_token_are_profiled(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    monkeypatch.setenv('PROFILING_ENABLED', 'true')
+    monkeypatch.setenv('PROFILING_TOKEN', 'profile-me')
+    monkeypatch.setenv('PROFILING_DIR', str(tmp_path))
+    monkeypatch.setattr(requests, 'get', stub)
+    test_app = app.create_app()
+    assert isinstance(test_app.wsgi_app, RequestProfiler)
+
+    with test_app.test_client() as client:
+        assert 'X-Profile-Id' not in client.get('/').headers
+        response = client.get('/', headers={'X-Profile-Token': 'profile-me'})
+
+    assert 'Item Name - Test One' in response.data.decode()
+    profile_id = response.headers['X-Profile-Id']
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f'{profile_id}.folded', f'{profile_id}.prof'
+    ]
+
+
+def test_profiling_never_fails_or_overlaps_requests(
+        monkeypatch, tmp_path, load_fake_environment_variables):
+    # The profile directory cannot be created, as a file is in the way
+    profile_dir = tmp_path / 'profiles'
+    profile_dir.write_text('')
+    monkeypatch.setenv('PROFILING_ENABLED', 'true')
+    monkeypatch.setenv('PROFILING_TOKEN', 'profile-me')
+    monkeypatch.setenv('PROFILING_DIR', str(profile_dir))
+    monkeypatch.setattr(requests, 'get', stub)
+    test_app = app.create_app()
+
+    with test_app.test_client() as client:
+        response = client.get('/', headers={'X-Profile-Token': 'profile-me'})
+        assert response.status_code == 200
+        assert 'X-Profile-Id' in response.headers
+
+        # A request arriving while another is profiled is served unprofiled
+        with test_app.wsgi_app._lock:
+            response = client.get(
+                '/', headers={'X-Profile-Token': 'profile-me'}
+            )
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+
+
+def test_profiling_is_disabled_by_default(client):
+    assert not isinstance(client.application.wsgi_app, RequestProfiler)
+
+
+def test_get_items_by_ids_batches_reads_and_keeps_input_order(
+        monkeypatch, client):
+    batch_sizes = []
+
+    def counting_stub(url, params={}):
+        if url == 'https://api.trello.com/1/batch':
+            batch_sizes.append(len(params['urls'].split(',')))
+        return stub(url, params)
+
+    monkeypatch.setattr(requests, 'get', counting_stub)
+    ids = ['0-64d573fa2e253', '64da8b95d5d3', '0-missing', '5-64da25b7',
+           '0-other-board-card']
+    ids += ['0-64da2712a8'] * 8
+    results = trello_items.get_items_by_ids(ids)
+
+    # The ID with an unknown shard is never sent to Trello
+    assert sorted(batch_sizes) == [3, 9]
+    assert [result.id for result in results] == ids
+    assert results[0].item.title == 'Item Name - Test One'
+    assert results[1].item.title == 'Task Four'
+    assert results[1].item.id == '0-64da8b95d5d3'
+    assert isinstance(results[2].error, requests.HTTPError)
+    assert isinstance(results[3].error, ValueError)
+    # Cards on boards outside the settings are not returned
+    assert results[4].item is None
+    assert isinstance(results[4].error, requests.HTTPError)
+    assert all(result.item.title == 'Task Three' for result in results[5:])
@@ -1,3 +1,27 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from todo_app.data.board_cache import BoardCache
+from todo_app.data.board_snapshot import (
+    SNAPSHOT_HEADER, SNAPSHOT_MAGIC, decode_snapshot, encode_snapshot
+)
+from todo_app.data.item import Item
+from todo_app.data.rate_limiter import RateLimiter
+from todo_app.data.session_store import SessionItemStore
+from todo_app.data import tenancy
+from todo_app.data.sharding import (
+    decode_item_id, encode_item_id, place_by_date
+)
+from todo_app.data.trello_config import TrelloConfig
+from todo_app.data.trello_provisioning import update_env_file
+from todo_app.lru_cache import LRUCache
+from todo_app.profiling import enforce_retention
+
+
 def test_view_model_todo_items(example_view_model_items):
     assert len(example_view_model_items.todo_items) > 0
     assert all(
@@ -17,3 +41,214 @@ def test_view_model_done_items(example_view_model_items):
     assert all(
         item.status == "Done" for item in example_view_model_items.done_items
     )
+
+
+def test_lru_cache_evicts_least_recently_used_entries():
+    cache = LRUCache(10, sizeof=len)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    cache.get('a')
+    cache.put('c', b'123')
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.size == 8
+
+
+def test_trello_config_validate_reports_missing_settings():
+    with pytest.raises(ValueError, match='TRELLO_BOARD_ID'):
+        TrelloConfig(api_key='key', api_token='token').validate()
+
+
+def test_tenant_lists_are_looked_up_once_by_concurrent_requests(
+        monkeypatch):
+    lookups = []
+
+    def slow_discover_list_ids(config):
+        lookups.append(config.tenant_id)
+        time.sleep(0.05)
+        return config
+
+    monkeypatch.setattr(tenancy, 'discover_list_ids', slow_discover_list_ids)
+    registry = tenancy.TenantRegistry(
+        TrelloConfig(api_key='key', api_token='token'),
+        {'team-a': {'board_ids': ['board-a']}}
+    )
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        configs = list(executor.map(registry.config_for, ['team-a'] * 8))
+    assert lookups == ['team-a']
+    assert all(config is configs[0] for config in configs)
+    assert registry.config_for('team-b') is None
+
+
+def test_rate_limiter_waits_for_the_window_to_free_up():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(max_calls=2, period=10, clock=lambda: now[0],
+                          sleep=sleep)
+    limiter.acquire()
+    now[0] = 4.0
+    limiter.acquire()
+    limiter.acquire()
+    assert waits == [6.0]
+
+
+def test_update_env_file_replaces_and_appends_values(tmp_path):
+    env_file = tmp_path / '.env'
+    env_file.write_text('SECRET_KEY=secret\nTRELLO_BOARD_ID=old\n')
+    update_env_file(str(env_file), {'TRELLO_BOARD_ID': 'new', 'EXTRA': '1'})
+    assert env_file.read_text() == (
+        'SECRET_KEY=secret\nTRELLO_BOARD_ID=new\nEXTRA=1\n'
+    )
+
+
+def test_item_ids_encode_their_shard():
+    assert decode_item_id(encode_item_id(3, '64d573fa2e253')) == (
+        3, '64d573fa2e253'
+    )
+    assert decode_item_id('64d573fa2e253') == (0, '64d573fa2e253')
+
+
+def test_place_by_date_keeps_items_due_the_same_day_together(
+        load_fake_environment_variables):
+    first = Item(title='First', due_date='2023-08-31')
+    second = Item(title='Second', due_date='2023-08-31T00:00:00.000Z')
+    assert place_by_date(first, 4) == place_by_date(second, 4)
+
+
+def test_board_cache_expires_and_evicts_boards():
+    now = [0.0]
+    card = {'id': 'card', 'name': 'Task', 'idList': 'list'}
+    board_cache = BoardCache(ttl=10, max_bytes=1000, clock=lambda: now[0])
+    board_cache.put('team-a', 'board-a', [card])
+    board_cache.put('team-b', 'board-b', [card])
+    assert board_cache.get('team-a', 'board-a')[0]['name'] == 'Task'
+    board_cache.put('team-c', 'board-c', [card])
+    assert board_cache.get('team-b', 'board-b') is None
+    now[0] = 10.0
+    assert board_cache.get('team-a', 'board-a') is None
+
+
+def test_board_cache_skips_boards_invalidated_while_fetched():
+    card = {'id': 'card', 'name': 'Task', 'idList': 'list'}
+    board_cache = BoardCache(ttl=10)
+    generation = board_cache.generation('team-a', 'board-a')
+    board_cache.invalidate('team-a', 'board-a')
+    board_cache.put('team-a', 'board-a', [card], generation)
+    assert board_cache.get('team-a', 'board-a') is None
+    generation = board_cache.generation('team-a', 'board-a')
+    board_cache.put('team-a', 'board-a', [card], generation)
+    assert board_cache.get('team-a', 'board-a')[0]['name'] == 'Task'
+
+    # Boards stay skipped once the marker of the invalidation is evicted
+    board_cache = BoardCache(ttl=10, max_bytes=1000)
+    generation = board_cache.generation('team-a', 'board-a')
+    board_cache.invalidate('team-a', 'board-a')
+    board_cache.put('team-b', 'board-b', [card])
+    board_cache.put('team-c', 'board-c', [card])
+    assert len(board_cache.entries()) == 2
+    board_cache.put('team-a', 'board-a', [card], generation)
+    assert board_cache.get('team-a', 'board-a') is None
+
+
+def test_board_snapshot_round_trip_and_version_check():
+    card = {'id': 'card', 'name': 'Task', 'idList': 'list'}
+    board_cache = BoardCache(ttl=10, clock=lambda: 5.0)
+    board_cache.put('team-a', 'board-a', [card])
+    snapshot = encode_snapshot(board_cache, 6.0)
+    assert decode_snapshot(snapshot) == ([
+        ('team-a', 'board-a', [{**card, 'desc': None, 'due': None}], 5.0)
+    ], [])
+
+    newer_snapshot = (SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 99)
+                      + snapshot[SNAPSHOT_HEADER.size:])
+    with pytest.raises(ValueError, match='version'):
+        decode_snapshot(newer_snapshot)
+
+
+def test_session_item_store_reloads_evicted_sessions_from_database():
+    store = SessionItemStore(':memory:', cache_size=1)
+    store.add_item('session-a', {'id': 0, 'title': 'A', 'status': 'Done'})
+    store.add_item('session-b', {'id': 0, 'title': 'B', 'status': 'Done'})
+    store.save_item('session-a', {'id': 0, 'title': 'A2', 'status': 'Done'})
+    store.save_item('session-a', {'id': 7, 'title': 'Missing'})
+    assert store.get_items('session-a') == [
+        {'id': 0, 'title': 'A2', 'status': 'Done'}
+    ]
+    assert store.get_item('session-b', 0)['title'] == 'B'
+    assert store.add_new_item('session-b', {'title': 'C'})['id'] == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        store.add_item('session-b', {'id': 1, 'title': 'Duplicate'})
+    store.get_item('session-b', 1)['title'] = 'Changed'
+    assert store.get_item('session-b', 1)['title'] == 'C'
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        added = list(executor.map(
+            lambda index: store.add_new_item('session-c', {'title': index}),
+            range(50)
+        ))
+    assert sorted(item['id'] for item in added) == list(range(50))
+
+
+def test_session_item_store_reads_do_not_write_to_the_database():
+    now = [0.0]
+    store = SessionItemStore(':memory:', clock=lambda: now[0])
+    store.add_item('session-a', {'id': 0, 'title': 'A'})
+    statements = []
+    store._connection.set_trace_callback(statements.append)
+    for _ in range(3):
+        store.get_item('session-a', 0)
+        store.get_items('session-a')
+    # Only the check for changes made by other processes is run
+    assert set(statements) == {'PRAGMA data_version'}
+
+    # The time each session was last used is written in batches
+    now[0] = 60.0
+    store.get_item('session-a', 0)
+    assert len([
+        statement for statement in statements
+        if statement.startswith('INSERT OR REPLACE INTO sessions')
+    ]) == 1
+
+
+def test_session_item_stores_sharing_a_database_see_each_others_items(
+        tmp_path):
+    database = str(tmp_path / 'session_items.sqlite3')
+    first_store = SessionItemStore(database)
+    second_store = SessionItemStore(database)
+    first_store.add_item('session-a', {'id': 0, 'title': 'A'})
+    assert second_store.get_items('session-a') == [{'id': 0, 'title': 'A'}]
+
+    assert first_store.add_new_item('session-a', {'title': 'B'})['id'] == 1
+    assert second_store.add_new_item('session-a', {'title': 'C'})['id'] == 2
+    second_store.save_item('session-a', {'id': 1, 'title': 'B2'})
+    assert [item['title'] for item in first_store.get_items('session-a')] == [
+        'A', 'B2', 'C'
+    ]
+
+
+def test_session_item_store_prunes_expired_sessions():
+    now = [0.0]
+    store = SessionItemStore(':memory:', max_age=100, clock=lambda: now[0])
+    store.add_item('session-a', {'id': 0, 'title': 'A'})
+    now[0] = 50.0
+    store.add_item('session-b', {'id': 0, 'title': 'B'})
+    now[0] = 120.0
+    assert store.prune_expired() == 1
+    assert store.get_items('session-a') == []
+    assert store.get_items('session-b') == [{'id': 0, 'title': 'B'}]
+
+
+def test_enforce_retention_deletes_the_oldest_profiles(tmp_path):
+    for index, name in enumerate(['old.prof', 'old.folded', 'new.prof']):
+        profile = tmp_path / name
+        profile.write_bytes(b'x' * 10)
+        os.utime(profile, (index, index))
+    enforce_retention(str(tmp_path), 20)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'new.prof', 'old.folded'
+    ]
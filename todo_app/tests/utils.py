@@ -1,6 +1,8 @@
 import json
 import os
 
+import requests
+
 
 class StubResponse():
     def __init__(self, fake_response_data, status_code=200):
@@ -14,11 +16,19 @@ class StubResponse():
     def status_code(self):
         return self._status_code
 
+    def raise_for_status(self):
+        if self._status_code >= 400:
+            raise requests.HTTPError(f'{self._status_code} error', response=self)
+
 
 def stub(url, params={}):
     test_board_id = os.environ.get('TRELLO_BOARD_ID')
     if url == f'https://api.trello.com/1/boards/{test_board_id}/cards':
         return mock_get_cards_endpoint()
+    elif url == f'https://api.trello.com/1/boards/{test_board_id}/lists':
+        return mock_get_lists_endpoint()
+    elif url == 'https://api.trello.com/1/batch':
+        return mock_get_batch_endpoint(params['urls'], test_board_id)
     elif url == 'https://api.trello.com/1/boards':
         return StubResponse([{'id': test_board_id}])
     raise Exception(f'Integration test did not expect URL "{url}"')
@@ -30,3 +40,35 @@ def mock_get_cards_endpoint():
         fake_response_data = json.load(file)
 
         return StubResponse(fake_response_data)
+
+
+def mock_get_batch_endpoint(urls, board_id):
+    urls = urls.split(',')
+    if len(urls) > 10:
+        return StubResponse({'message': 'Too many urls'}, status_code=400)
+
+    # Cards can be read by ID alone, or through the board they are on
+    board_cards = mock_get_cards_endpoint().json()
+    other_board_cards = [{'id': 'other-board-card', 'name': 'Other Task',
+                          'idBoard': 'other-board-id'}]
+    cards = {
+        f"/cards/{card['id']}": card
+        for card in board_cards + other_board_cards
+    }
+    cards.update({
+        f"/boards/{board_id}/cards/{card['id']}": card for card in board_cards
+    })
+    return StubResponse([
+        {'200': cards[url]} if url in cards
+        else {'404': 'The requested resource was not found.'}
+        for url in urls
+    ])
+
+
+def mock_get_lists_endpoint():
+    return StubResponse([
+        {'id': '0000001', 'name': 'To Do'},
+        {'id': '0000002', 'name': 'Doing'},
+        {'id': '0000003', 'name': 'Done'},
+        {'id': '0000004', 'name': 'Archive'}
+    ])